@@ -1,8 +1,15 @@
 import { useEffect } from 'react'
 import { useCameraStore, useTelemetryStore } from '../store/useStore'
 
+const SERVER_URL = 'ws://127.0.0.1:8765'
+
 let socket = null
 
+// Survives reconnects so a dropped connection can resume where it left off
+const session = { epoch: null, lastSeq: {} }
+
+const SEQ_STREAMS = { map_data: 'map', snapshot: 'events' }
+
 export const sendDroneCommand = (vertical, roll, pitch, yaw) => {
   if (socket && socket.readyState === WebSocket.OPEN) {
     const command = {
@@ -46,62 +53,107 @@ const WebotsConnector = () => {
   const setTelemetry = useTelemetryStore((state) => state.setTelemetry)
 
   useEffect(() => {
-    const ws = new WebSocket('ws://127.0.0.1:8765')
-    socket = ws
-    ws.onopen = () => {
-      console.log('Connected to Webots Python controller')
-      console.log('Socket is now ready, readyState:', ws.readyState)
-    }
+    let closed = false
+    let retryTimer = null
+    let retryDelay = 500
 
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data)
-
-      if (data.camera) {
-        const imageUrl = `data:image/jpeg;base64,${data.camera.data}`
-        setCameraImage(imageUrl)
-        setActiveCamera(data.camera.active)
-        setCameraStats(data.camera.resolution, data.camera.fps)
+    const connect = () => {
+      const resume = session.epoch !== null
+      const ws = new WebSocket(resume ? `${SERVER_URL}/?resume` : SERVER_URL)
+      socket = ws
+      ws.onopen = () => {
+        console.log('Connected to Webots Python controller')
+        console.log('Socket is now ready, readyState:', ws.readyState)
+        retryDelay = 500
+        if (resume) {
+          // Ask only for what was missed while disconnected
+          ws.send(
+            JSON.stringify({
+              type: 'resume',
+              epoch: session.epoch,
+              last_seq: session.lastSeq,
+            }),
+          )
+        }
       }
 
-      if (data.telemetry) {
-        setTelemetry({
-          altitude: data.telemetry.altitude,
-          target: data.telemetry.target,
-          roll: data.telemetry.roll,
-          pitch: data.telemetry.pitch,
-          yaw: data.telemetry.yaw,
-          heading: data.telemetry.heading,
-          gps: data.telemetry.gps,
-          x: data.telemetry.gps?.lat,
-          y: data.telemetry.gps?.lon,
-          battery: data.telemetry.battery,
-          signal_strength: data.telemetry.signal_strength,
-          temperatures: data.telemetry.temperatures,
-          wind_speed: data.telemetry.wind_speed,
-          flight_mode: data.telemetry.flight_mode,
-          timestamp: data.timestamp,
-        })
+      ws.onmessage = (event) => {
+        const data = JSON.parse(event.data)
+
+        if (data.type === 'hello' || data.type === 'resume') {
+          session.epoch = data.epoch
+        }
+        if (typeof data.seq === 'number') {
+          session.lastSeq[SEQ_STREAMS[data.type] || data.type] = data.seq
+        }
+
+        if (data.camera) {
+          const imageUrl = `data:image/jpeg;base64,${data.camera.data}`
+          setCameraImage(imageUrl)
+          setActiveCamera(data.camera.active)
+          setCameraStats(data.camera.resolution, data.camera.fps)
+        }
+
+        if (data.telemetry) {
+          setTelemetry({
+            altitude: data.telemetry.altitude,
+            target: data.telemetry.target,
+            roll: data.telemetry.roll,
+            pitch: data.telemetry.pitch,
+            yaw: data.telemetry.yaw,
+            heading: data.telemetry.heading,
+            gps: data.telemetry.gps,
+            x: data.telemetry.gps?.lat,
+            y: data.telemetry.gps?.lon,
+            battery: data.telemetry.battery,
+            signal_strength: data.telemetry.signal_strength,
+            temperatures: data.telemetry.temperatures,
+            wind_speed: data.telemetry.wind_speed,
+            flight_mode: data.telemetry.flight_mode,
+            timestamp: data.timestamp,
+          })
+        }
+
+        // Apply state changes that happened while telemetry was not flowing
+        const state =
+          data.snapshot ||
+          (data.events?.event === 'flight_mode' && { flight_mode: data.events.mode })
+        if (state) {
+          if (state.flight_mode) {
+            const { telemetry } = useTelemetryStore.getState()
+            setTelemetry({ ...telemetry, flight_mode: state.flight_mode })
+          }
+          if (state.camera) setActiveCamera(state.camera)
+        }
+
+        // Dispatch map data events for TacticalMap component
+        if (data.type === 'map_data') {
+          window.dispatchEvent(
+            new MessageEvent('webots-message', { data: event.data }),
+          )
+        }
       }
 
-      // Dispatch map data events for TacticalMap component
-      if (data.type === 'map_data') {
-        window.dispatchEvent(
-          new MessageEvent('webots-message', { data: event.data }),
-        )
+      ws.onerror = (err) => {
+        console.error('WebSocket Error:', err)
       }
-    }
 
-    ws.onerror = (err) => {
-      console.error('WebSocket Error:', err)
+      ws.onclose = () => {
+        console.log('Disconnected from controller')
+        if (socket === ws) socket = null
+        if (!closed) {
+          retryTimer = setTimeout(connect, retryDelay)
+          retryDelay = Math.min(retryDelay * 2, 5000)
+        }
+      }
     }
 
-    ws.onclose = () => {
-      console.log('Disconnected from controller')
-      socket = null
-    }
+    connect()
 
     return () => {
-      if (ws) ws.close()
+      closed = true
+      clearTimeout(retryTimer)
+      if (socket) socket.close()
     }
   }, [setCameraImage, setActiveCamera, setCameraStats, setTelemetry])
 
@@ -0,0 +1,87 @@
+import collections
+
+
+class CommandBus:
+    """Multi-producer, single-consumer bus for inbound control messages.
+
+    Producers (the asyncio thread) only append to a deque, which is atomic
+    under the GIL, so posting never takes a lock. The control loop drains
+    the bus once per step and runs the registered handlers on its own
+    thread, which keeps every Webots device call inside the controller.
+    """
+
+    def __init__(self, max_per_step=32, coalesce_types=()):
+        self.max_per_step = max_per_step
+        self.coalesce_types = set(coalesce_types)
+        self.handlers = {}
+        self._inbox = collections.deque()
+        self._pending = collections.deque()  # Only touched by the consumer
+        self.stats = {
+            'posted': 0,
+            'dispatched': 0,
+            'coalesced': 0,
+            'depth': 0,
+            'max_depth': 0,
+            'deferred': 0
+        }
+
+    def register(self, msg_type, handler):
+        """Register the handler called for a message type"""
+        self.handlers[msg_type] = handler
+
+    def post(self, msg_type, payload=None):
+        """Queue a message (safe to call from any thread)"""
+        self._inbox.append((msg_type, payload))
+        self.stats['posted'] += 1
+
+    def _coalesce(self):
+        """Keep only the newest pending message of each coalesced type"""
+        if not self.coalesce_types:
+            return
+        seen = set()
+        kept = []
+        for msg_type, payload in reversed(self._pending):
+            if msg_type in self.coalesce_types:
+                if msg_type in seen:
+                    self.stats['coalesced'] += 1
+                    continue
+                seen.add(msg_type)
+            kept.append((msg_type, payload))
+        if len(kept) != len(self._pending):
+            kept.reverse()
+            self._pending = collections.deque(kept)
+
+    def drain(self):
+        """Dispatch queued messages, at most max_per_step per call
+
+        Must be called from the control loop thread. Returns the number
+        of messages dispatched.
+        """
+        # Only take what is present now so a busy producer can't starve us
+        for _ in range(len(self._inbox)):
+            self._pending.append(self._inbox.popleft())
+
+        self._coalesce()
+
+        dispatched = 0
+        while self._pending and dispatched < self.max_per_step:
+            msg_type, payload = self._pending.popleft()
+            handler = self.handlers.get(msg_type)
+            if handler:
+                try:
+                    handler(payload)
+                except Exception:
+                    pass
+            dispatched += 1
+
+        self.stats['dispatched'] += dispatched
+        if self._pending:
+            self.stats['deferred'] += 1
+        depth = len(self._pending) + len(self._inbox)
+        self.stats['depth'] = depth
+        self.stats['max_depth'] = max(self.stats['max_depth'], depth)
+        return dispatched
+
+    def get_stats(self):
+        """Return a copy of the bus metrics"""
+        return dict(self.stats)
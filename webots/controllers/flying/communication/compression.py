@@ -0,0 +1,110 @@
+import zlib
+
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory,
+)
+from websockets.frames import CTRL_OPCODES, Frame, Opcode
+
+
+def message_prefix(msg_type):
+    """Leading bytes of a JSON message of the given type"""
+    return ('{"type": "%s"' % msg_type).encode('utf-8')
+
+
+class CompressionPolicy:
+    """Per-message-type permessage-deflate policy
+
+    Messages whose type is listed in `uncompressed` (already-compressed
+    payloads such as JPEG frames) are sent as plain frames, which RFC 7692
+    allows per message. Everything else is deflated with the configured
+    level and window. Static messages can be compressed once with
+    precompress() and reused for every client.
+    """
+
+    def __init__(self, uncompressed=('camera',), level=6, window_bits=12, mem_level=5):
+        self.uncompressed = tuple(message_prefix(t) for t in uncompressed)
+        self.level = level
+        self.window_bits = window_bits
+        self.mem_level = mem_level
+        self.precompressed = []  # (message bytes, deflated payload)
+
+    def skip(self, data):
+        """Check if a message should be sent uncompressed"""
+        return bytes(data[:32]).startswith(self.uncompressed)
+
+    def precompress(self, message):
+        """Deflate a static message once, independent of any connection"""
+        data = message.encode('utf-8')
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -self.window_bits, 9)
+        payload = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        # Drop the trailing empty block, as permessage-deflate requires
+        self.precompressed = [
+            entry for entry in self.precompressed if entry[0] != data
+        ] + [(data, payload[:-4])]
+
+    def lookup(self, data, window_bits):
+        """Precompressed payload for a message, if usable with this window"""
+        if window_bits < self.window_bits:
+            return None
+        for message, payload in self.precompressed:
+            if len(message) == len(data) and message == data:
+                return payload
+        return None
+
+    def extension_factory(self):
+        """Server extension factory to pass to websockets.serve"""
+        return PolicyDeflateFactory(self)
+
+
+class PolicyPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that applies a CompressionPolicy per message"""
+
+    def __init__(self, policy, *args):
+        super().__init__(*args)
+        self.policy = policy
+        self.skipping = False
+        # Until the encoder has produced output, both LZ77 windows are empty
+        # and an independently compressed message can be sent as is
+        self.fresh = True
+
+    def encode(self, frame):
+        if frame.opcode in CTRL_OPCODES:
+            return frame
+        if frame.opcode is Opcode.CONT:
+            return frame if self.skipping else super().encode(frame)
+
+        self.skipping = self.policy.skip(frame.data)
+        if self.skipping:
+            return frame
+
+        if frame.fin and (self.fresh or self.local_no_context_takeover):
+            payload = self.policy.lookup(frame.data, self.local_max_window_bits)
+            if payload is not None:
+                return Frame(frame.opcode, payload, frame.fin, True, frame.rsv2, frame.rsv3)
+
+        self.fresh = False
+        return super().encode(frame)
+
+
+class PolicyDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate and builds PolicyPerMessageDeflate"""
+
+    def __init__(self, policy):
+        super().__init__(
+            server_max_window_bits=policy.window_bits,
+            client_max_window_bits=policy.window_bits,
+            compress_settings={'level': policy.level, 'memLevel': policy.mem_level}
+        )
+        self.policy = policy
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, PolicyPerMessageDeflate(
+            self.policy,
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings
+        )
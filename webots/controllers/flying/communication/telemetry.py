@@ -32,11 +32,13 @@ class TelemetryFormatter:
         }
     
     @staticmethod
-    def create_message(camera_data, telemetry_data, timestamp):
-        """Create complete WebSocket message"""
-        return json.dumps({
-            'type': 'sensor_data',
+    def create_message(topic, data, timestamp, seq=None):
+        """Create WebSocket message for one topic"""
+        message = {
+            'type': topic,
             'timestamp': timestamp,
-            'camera': camera_data,
-            'telemetry': telemetry_data
-        })
+            topic: data
+        }
+        if seq is not None:
+            message['seq'] = seq
+        return json.dumps(message)
@@ -1,48 +1,134 @@
 import asyncio
 import websockets
 import json
-import queue
 import logging
+import math
+import os
 import threading
+import time
+import uuid
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+from communication.command_bus import CommandBus
+from communication.compression import CompressionPolicy
+from communication.telemetry import TelemetryFormatter
 
 logger = logging.getLogger(__name__)
 
+TOPICS = ('camera', 'telemetry', 'map', 'stats', 'events')
+# Topics where every message is delivered in order; others send only the latest
+EVENT_TOPICS = ('events',)
+
 class WebSocketServer:
-    def __init__(self, host, port):
+    def __init__(self, host, port, command_budget=32, default_subscriptions=None,
+                 compression='deflate', replay_sizes=None):
         self.host = host
         self.port = port
-        self.clients = set()
-        self.command_queue = queue.Queue(maxsize=1)
-        self.flight_mode_callback = None
-        self.camera_switch_callback = None
-        self.camera_control_callback = None
-        self.latest_frame = {'data': None, 'lock': threading.Lock()}
+        # 'deflate' (library default), None, or a CompressionPolicy
+        self.compression = compression
+        # websocket -> {topic: {'max_rate', 'last_sent', 'seq'}}
+        self.clients = {}
+        self.default_subscriptions = default_subscriptions or {}
+        # Aggregate max rate per subscribed topic (None = unlimited)
+        self.topic_rates = {}
+        # Inbound control messages are handled on the control loop thread
+        self.command_bus = CommandBus(
+            max_per_step=command_budget,
+            coalesce_types=('motor_command', 'camera_control')
+        )
+        self.topics = {}
+        self.topic_lock = threading.Lock()
+        self.delivered = {}  # topic -> last seq sent to any client
+        # Bounded per-topic history of (seq, message) for resuming clients
+        self.replay_sizes = replay_sizes or {}
+        self.replay = {}
+        self.snapshot = None
+        # Sequence numbers restart with the controller; clients resume within one epoch
+        self.epoch = uuid.uuid4().hex[:8]
+        self.resuming = set()
         self.map_data = None
+        self.map_seq = 0
+        self.profiler = None
+        self.profile_dir = None
+        self.thread = None
+    
+    def set_profiler(self, profiler, output_dir):
+        """Set sampling profiler controlled by 'profiler' messages"""
+        self.profiler = profiler
+        self.profile_dir = output_dir
+    
+    def _subscribe(self, websocket, topic, max_rate):
+        """Add or update one topic subscription for a client"""
+        seq = 0
+        if topic in EVENT_TOPICS and topic in self.topics:
+            seq = self.topics[topic]['seq']  # New subscribers get events from now on
+        self.clients[websocket][topic] = {'max_rate': max_rate, 'last_sent': 0.0, 'seq': seq}
     
-    def set_flight_mode_callback(self, callback):
-        """Set callback for flight mode changes"""
-        self.flight_mode_callback = callback
+    def _parse_topics(self, data):
+        """Known topics and max rates from a subscribe or resume message
+        
+        'topics' is either a list (sharing an optional 'max_rate') or a dict
+        of topic -> max rate; anything else subscribes to nothing.
+        """
+        topics = data.get('topics', [])
+        if isinstance(topics, list):
+            topics = {topic: data.get('max_rate') for topic in topics}
+        elif not isinstance(topics, dict):
+            return {}
+        parsed = {}
+        for topic, max_rate in topics.items():
+            if topic not in TOPICS:
+                continue
+            max_rate = float(max_rate) if max_rate is not None else None
+            if max_rate is not None and not (math.isfinite(max_rate) and max_rate > 0):
+                continue
+            parsed[topic] = max_rate
+        return parsed
     
-    def set_camera_switch_callback(self, callback):
-        """Set callback for camera switches"""
-        self.camera_switch_callback = callback
+    def _update_aggregate(self):
+        """Recompute per-topic subscription state for the control loop"""
+        rates = {}
+        for subscriptions in self.clients.values():
+            for topic, sub in subscriptions.items():
+                rate = sub['max_rate']
+                if topic not in rates:
+                    rates[topic] = rate
+                elif rates[topic] is not None:
+                    rates[topic] = None if rate is None else max(rates[topic], rate)
+        # Swap in a new dict so readers on other threads see a consistent view
+        self.topic_rates = rates
     
-    def set_camera_control_callback(self, callback):
-        """Set callback for manual camera control"""
-        self.camera_control_callback = callback
+    @staticmethod
+    def _request_path(websocket):
+        """Request path on both the asyncio server (websockets 14+) and the legacy one"""
+        request = getattr(websocket, 'request', None)
+        if request is not None:
+            return request.path
+        return getattr(websocket, 'path', '/')
     
     async def handler(self, websocket):
         """Handle WebSocket connections"""
-        self.clients.add(websocket)
-        
-        # Send map data to newly connected client
-        if self.map_data:
-            try:
-                await websocket.send(self.map_data)
-            except:
-                pass
+        self.clients[websocket] = {}
         
         try:
+            # Clients connecting with ?resume send a 'resume' message instead
+            query = parse_qs(urlsplit(self._request_path(websocket)).query, keep_blank_values=True)
+            if 'resume' not in query:
+                for topic, max_rate in self.default_subscriptions.items():
+                    self._subscribe(websocket, topic, max_rate)
+                self._update_aggregate()
+                
+                # Send map data and current state to newly connected client
+                try:
+                    if self.map_data and 'map' in self.clients[websocket]:
+                        await websocket.send(self.map_data)
+                    await websocket.send(json.dumps({'type': 'hello', 'epoch': self.epoch}))
+                    if self.snapshot and any(t in self.clients[websocket] for t in EVENT_TOPICS):
+                        await websocket.send(self.snapshot[1])
+                except:
+                    pass
+            
             async for message in websocket:
                 try:
                     data = json.loads(message)
@@ -53,87 +139,275 @@ class WebSocketServer:
                         pitch = max(-1.0, min(1.0, float(data.get('pitch', 0.0))))
                         yaw = max(-1.0, min(1.0, float(data.get('yaw', 0.0))))
                         
-                        try:
-                            self.command_queue.put_nowait({
-                                'vertical': vertical,
-                                'roll': roll,
-                                'pitch': pitch,
-                                'yaw': yaw
-                            })
-                        except queue.Full:
-                            self.command_queue.get_nowait()
-                            self.command_queue.put_nowait({
-                                'vertical': vertical,
-                                'roll': roll,
-                                'pitch': pitch,
-                                'yaw': yaw
-                            })
+                        self.command_bus.post('motor_command', {
+                            'vertical': vertical,
+                            'roll': roll,
+                            'pitch': pitch,
+                            'yaw': yaw
+                        })
+                    
+                    elif data['type'] == 'flight_mode':
+                        self.command_bus.post('flight_mode', data.get('mode', 'manual'))
+                    
+                    elif data['type'] == 'camera_switch':
+                        self.command_bus.post('camera_switch', data.get('camera', 'front'))
+                    
+                    elif data['type'] == 'mission':
+                        waypoints = []
+                        for wp in data.get('waypoints', [])[:100]:
+                            waypoint = {
+                                'x': float(wp['x']),
+                                'y': float(wp['y']),
+                                'z': float(wp['z']) if wp.get('z') is not None else None
+                            }
+                            # json.loads accepts NaN and Infinity
+                            if not all(math.isfinite(v) for v in waypoint.values() if v is not None):
+                                raise ValueError('non-finite waypoint')
+                            waypoints.append(waypoint)
+                        self.command_bus.post('mission', waypoints)
                     
-                    elif data['type'] == 'flight_mode' and self.flight_mode_callback:
-                        mode = data.get('mode', 'manual')
-                        self.flight_mode_callback(mode)
+                    elif data['type'] == 'subscribe':
+                        for topic, max_rate in self._parse_topics(data).items():
+                            self._subscribe(websocket, topic, max_rate)
+                            if topic == 'map' and self.map_data:
+                                await websocket.send(self.map_data)
+                        self._update_aggregate()
                     
-                    elif data['type'] == 'camera_switch' and self.camera_switch_callback:
-                        camera = data.get('camera', 'front')
-                        self.camera_switch_callback(camera)
+                    elif data['type'] == 'unsubscribe':
+                        for topic in data.get('topics', []):
+                            self.clients[websocket].pop(topic, None)
+                        self._update_aggregate()
                     
-                    elif data['type'] == 'camera_control' and self.camera_control_callback:
-                        pitch = data.get('pitch', 0)
-                        yaw = data.get('yaw', 0)
-                        self.camera_control_callback(pitch, yaw)
+                    elif data['type'] == 'resume':
+                        await self._resume(websocket, data)
+                    
+                    elif data['type'] == 'profiler' and self.profiler:
+                        await self._handle_profiler(websocket, data)
+                    
+                    elif data['type'] == 'camera_control':
+                        self.command_bus.post('camera_control', {
+                            'pitch': float(data.get('pitch', 0)),
+                            'yaw': float(data.get('yaw', 0))
+                        })
                         
-                except (json.JSONDecodeError, ValueError, KeyError) as e:
+                except (json.JSONDecodeError, ValueError, TypeError, KeyError, AttributeError) as e:
                     pass
         except websockets.exceptions.ConnectionClosed:
             pass
         except Exception as e:
             pass
         finally:
-            self.clients.remove(websocket)
+            self.clients.pop(websocket, None)
+            self._update_aggregate()
+    
+    async def _resume(self, websocket, data):
+        """Restore subscriptions and send what a reconnecting client missed
+        
+        For each subscribed topic the client gets the messages newer than its
+        last seen seq: the buffered events, or the latest message for the
+        other topics. If the events it missed are no longer buffered (or the
+        controller restarted) it gets the state snapshot instead.
+        """
+        same_epoch = data.get('epoch') == self.epoch
+        last_seq = data.get('last_seq')
+        if not isinstance(last_seq, dict):
+            last_seq = {}
+        if data.get('topics') is not None or not self.clients[websocket]:
+            if data.get('topics') is not None:
+                topics = self._parse_topics(data)
+            else:
+                topics = self.default_subscriptions
+            self.clients[websocket] = {}
+            for topic, max_rate in topics.items():
+                self._subscribe(websocket, topic, max_rate)
+            self._update_aggregate()
+        
+        with self.topic_lock:
+            buffers = {topic: list(self.replay.get(topic, ())) for topic in self.clients[websocket]}
+        snapshot = self.snapshot
+        
+        messages = []
+        streams = {}
+        now = time.monotonic()
+        for topic, sub in self.clients[websocket].items():
+            last = int(last_seq.get(topic) or 0) if same_epoch else 0
+            if topic == 'map':
+                if self.map_data and last < self.map_seq:
+                    messages.append(self.map_data)
+                    streams[topic] = 'snapshot'
+                else:
+                    streams[topic] = 'current'
+                continue
+            
+            buffer = buffers[topic]
+            newest = buffer[-1][0] if buffer else 0
+            sub['seq'] = newest
+            sub['last_sent'] = now
+            if topic in EVENT_TOPICS and (not same_epoch or buffer and last < buffer[0][0] - 1):
+                last = 0
+                if snapshot:
+                    messages.append(snapshot[1])
+                    last = snapshot[0]
+                messages.extend(message for seq, message in buffer if seq > last)
+                streams[topic] = 'snapshot'
+            elif last >= newest:
+                streams[topic] = 'current'
+            elif topic in EVENT_TOPICS:
+                missed = [message for seq, message in buffer if seq > last]
+                messages.extend(missed)
+                streams[topic] = len(missed)
+            else:
+                messages.append(buffer[-1][1])
+                streams[topic] = 'latest'
+        
+        # Hold back broadcasts so replayed messages stay in order
+        self.resuming.add(websocket)
+        try:
+            await websocket.send(json.dumps({
+                'type': 'resume',
+                'epoch': self.epoch,
+                'streams': streams
+            }))
+            for message in messages:
+                await websocket.send(message)
+            # The client now holds the newest message on each topic, which is
+            # what is_delivered() reports to the control loop
+            for topic, sub in self.clients[websocket].items():
+                if sub['seq']:
+                    self.delivered[topic] = sub['seq']
+        finally:
+            self.resuming.discard(websocket)
+    
+    async def _handle_profiler(self, websocket, data):
+        """Start, stop, fetch or save the profiler and reply with its status"""
+        action = data.get('action')
+        reply = {'type': 'profiler', 'action': action}
+        
+        if action == 'start':
+            interval_ms = data.get('interval_ms')
+            reply['ok'] = self.profiler.start(float(interval_ms) / 1000.0 if interval_ms else None)
+        elif action == 'stop':
+            reply['ok'] = self.profiler.stop()
+        elif action == 'fetch':
+            reply['data'] = self.profiler.collapsed()
+        elif action == 'save':
+            os.makedirs(self.profile_dir, exist_ok=True)
+            path = os.path.join(self.profile_dir, time.strftime('profile-%Y%m%d-%H%M%S.collapsed'))
+            loop = asyncio.get_running_loop()
+            reply['path'] = await loop.run_in_executor(None, self.profiler.write, path)
+        else:
+            return
+        
+        reply.update(self.profiler.get_status())
+        await websocket.send(json.dumps(reply))
     
     async def broadcast_frames(self):
-        """Continuously broadcast frames to all clients"""
+        """Send each client the new messages on its topics, within its rates"""
         while True:
-            with self.latest_frame['lock']:
-                frame_data = self.latest_frame['data']
+            with self.topic_lock:
+                latest = dict(self.topics)
+                events = {topic: list(self.replay[topic])
+                          for topic in EVENT_TOPICS if topic in self.replay}
             
-            if frame_data and self.clients:
-                disconnected = set()
-                for client in self.clients.copy():
+            now = time.monotonic()
+            disconnected = set()
+            for client, subscriptions in list(self.clients.items()):
+                if client in self.resuming:
+                    continue
+                for topic, sub in list(subscriptions.items()):
+                    entry = latest.get(topic)
+                    if entry is None or entry['seq'] == sub['seq']:
+                        continue
+                    if sub['max_rate'] and now - sub['last_sent'] < 1.0 / sub['max_rate']:
+                        continue
+                    if topic in events:
+                        messages = [message for seq, message in events[topic] if seq > sub['seq']]
+                    else:
+                        messages = [entry['data']]
                     try:
-                        await client.send(frame_data)
+                        for message in messages:
+                            await client.send(message)
                     except:
                         disconnected.add(client)
+                        break
+                    sub['seq'] = entry['seq']
+                    sub['last_sent'] = now
+                    self.delivered[topic] = entry['seq']
+            
+            if disconnected:
                 for client in disconnected:
-                    self.clients.discard(client)
+                    self.clients.pop(client, None)
+                self._update_aggregate()
             
             await asyncio.sleep(0.016)
     
     async def run(self):
         """Start WebSocket server"""
-        async with websockets.serve(self.handler, self.host, self.port):
+        if isinstance(self.compression, CompressionPolicy):
+            options = {'extensions': [self.compression.extension_factory()]}
+        else:
+            options = {'compression': self.compression}
+        async with websockets.serve(self.handler, self.host, self.port, **options):
             await self.broadcast_frames()
     
     def start(self):
         """Start server in background thread"""
-        thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
-        thread.start()
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.run()), daemon=True)
+        self.thread.start()
     
-    def get_command(self):
-        """Get next command from queue (non-blocking)"""
-        try:
-            return self.command_queue.get_nowait()
-        except queue.Empty:
-            return None
+    def has_subscribers(self, topic):
+        """Check if any client is subscribed to a topic"""
+        return topic in self.topic_rates
+    
+    def should_publish(self, topic):
+        """Check if a topic has subscribers and is due at their max rate"""
+        rates = self.topic_rates
+        if topic not in rates:
+            return False
+        if rates[topic] is None:
+            return True
+        entry = self.topics.get(topic)
+        return entry is None or time.monotonic() - entry['time'] >= 1.0 / rates[topic]
+    
+    def is_delivered(self, topic):
+        """Check if the latest message on a topic has gone out to a client"""
+        entry = self.topics.get(topic)
+        return entry is None or self.delivered.get(topic) == entry['seq']
+    
+    def publish(self, topic, data, timestamp):
+        """Stamp a message with the topic's next seq and queue it for broadcasting"""
+        previous = self.topics.get(topic)
+        seq = previous['seq'] + 1 if previous else 1
+        message = TelemetryFormatter.create_message(topic, data, timestamp, seq)
+        with self.topic_lock:
+            self.topics[topic] = {
+                'data': message,
+                'seq': seq,
+                'time': time.monotonic()
+            }
+            if topic not in self.replay:
+                self.replay[topic] = deque(maxlen=self.replay_sizes.get(topic, 1))
+            self.replay[topic].append((seq, message))
     
-    def update_frame(self, frame_data):
-        """Update latest frame for broadcasting"""
-        with self.latest_frame['lock']:
-            self.latest_frame['data'] = frame_data
+    def set_snapshot(self, state, timestamp):
+        """Store controller state sent in place of events a client can't replay"""
+        entry = self.topics.get('events')
+        seq = entry['seq'] if entry else 0
+        self.snapshot = (seq, json.dumps({
+            'type': 'snapshot',
+            'timestamp': timestamp,
+            'seq': seq,
+            'snapshot': state
+        }))
     
     def send_map_data(self, map_data):
         """Store map data for sending to clients"""
+        self.map_seq += 1
         self.map_data = json.dumps({
             'type': 'map_data',
-            'data': map_data
+            'data': map_data,
+            'seq': self.map_seq
         })
+        # Compress once and reuse for every connecting client
+        if isinstance(self.compression, CompressionPolicy):
+            self.compression.precompress(self.map_data)
@@ -3,10 +3,52 @@ CONFIG = {
     'host': 'localhost',
     'port': 8765,
     'frame_interval': 2,
+    'camera_target_fps': 30.0,
     'jpeg_quality': 85,
+    'command_budget': 32,
+    'default_subscriptions': {'camera': None, 'telemetry': None, 'map': None, 'events': None},
+    'replay_buffer': {'events': 256, 'camera': 1, 'telemetry': 1, 'stats': 1},
+    'battery_alerts': [20, 10],
+    'compression': 'policy',
+    'compression_uncompressed': ['camera'],
+    'compression_level': 6,
+    'compression_window_bits': 12,
+    'compression_mem_level': 5,
     'k_vertical_thrust': 68.5,
     'k_vertical_offset': 0.6,
     'k_vertical_p': 3.0,
     'k_roll_p': 50.0,
     'k_pitch_p': 20.0,
+    'planner_resolution': 0.5,
+    'planner_clearance': 1.5,
+    'planner_time_budget': 1.0,
+    'planner_obstacle_radius': {
+        'building': 8.0,
+        'windmill': 4.0,
+        'tree': 2.5,
+        'vehicle': 3.0,
+        'container': 1.0,
+    },
+    'mission_altitude': 3.0,
+    'mission_arrival_radius': 0.5,
+    'mission_lookahead': 2.0,
+    'mission_replan_distance': 3.0,
+    'mission_gain': 0.2,
+    'mission_max_tilt': 0.5,
+    'flow_rate_hz': 15.0,
+    'flow_downscale': 4,
+    'flow_pyramid_levels': 3,
+    'flow_min_quality': 1.0,
+    'flow_max_age': 0.5,
+    'flow_min_camera_pitch': 60.0,
+    'use_state_estimate': True,
+    'ekf_gps_noise': 0.2,
+    'ekf_attitude_noise': 0.01,
+    'ekf_position_noise': 0.01,
+    'ekf_accel_noise': 1.0,
+    'ekf_gyro_noise': 0.05,
+    'ekf_bias_noise': 0.001,
+    'profiler_interval': 0.005,
+    'profiler_max_samples': 50000,
+    'profiler_output_dir': 'profiles',
 }
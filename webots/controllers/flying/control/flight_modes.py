@@ -1,6 +1,7 @@
 class FlightModeManager:
-    def __init__(self):
+    def __init__(self, mission=None):
         self.mode = 'idle'
+        self.mission = mission
         self.auto_targets = {
             'takeoff': 2.0,
             'land': 0.3,
@@ -11,7 +12,19 @@ class FlightModeManager:
     
     def set_mode(self, mode):
         """Set flight mode"""
-        if mode in ['idle', 'manual', 'takeoff', 'land', 'hover', 'rth', 'emergency_stop']:
+        if mode in ['idle', 'manual', 'takeoff', 'land', 'hover', 'rth', 'mission', 'emergency_stop']:
+            # Waypoint mission (needs loaded waypoints)
+            if mode == 'mission':
+                if self.mission is None or not self.mission.resume():
+                    return False
+                self.mode = 'mission'
+                self.auto_targets['hover'] = None  # Hover at mission altitude afterwards
+                return True
+            
+            # Any other mode stops an active mission or planned RTH
+            if self.mission:
+                self.mission.cancel()
+            
             # Emergency stop kills everything and lands
             if mode == 'emergency_stop':
                 self.emergency_stopped = False  # Clear emergency flag
@@ -20,7 +33,10 @@ class FlightModeManager:
             
             # Return to home
             if mode == 'rth':
+                if self.mission:
+                    self.mission.reset()  # Abort mission, home path is planned on update
                 self.mode = 'rth'
+                self.auto_targets['hover'] = None
                 return True
             
             # Clear emergency stop flag when switching to other modes
@@ -42,7 +58,7 @@ class FlightModeManager:
         if self.home_position is None:
             self.home_position = position
     
-    def update(self, altitude, pid_controller, current_position=None):
+    def update(self, altitude, pid_controller, current_position=None, yaw=0.0):
         """Update flight mode logic and set appropriate targets"""
         # Emergency stop overrides everything
         if self.emergency_stopped:
@@ -57,9 +73,26 @@ class FlightModeManager:
             # Stay grounded, don't change altitude
             pass
         
+        elif self.mode == 'mission':
+            state = self.mission.update(current_position, yaw, pid_controller)
+            if state in ('complete', 'failed', 'idle'):
+                # Hold position once the mission is over
+                self.set_mode('hover')
+        
         elif self.mode == 'rth':
             # Return to home position
-            if self.home_position and current_position:
+            if self.home_position and current_position and self.mission:
+                # Fly a planned path around obstacles, then land
+                if self.mission.state == 'idle':
+                    self.mission.load([{
+                        'x': self.home_position[0],
+                        'y': self.home_position[1],
+                        'z': self.auto_targets['takeoff']
+                    }])
+                state = self.mission.update(current_position, yaw, pid_controller)
+                if state in ('complete', 'failed'):
+                    self.mode = 'land'
+            elif self.home_position and current_position:
                 # Calculate distance to home
                 dx = self.home_position[0] - current_position[0]
                 dz = self.home_position[2] - current_position[2]
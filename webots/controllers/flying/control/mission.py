@@ -0,0 +1,188 @@
+import math
+
+
+class MissionManager:
+    """Flies a list of waypoints along paths from a PlannerWorker
+
+    Each leg is planned in the background; until a path arrives the drone
+    holds position. When the drone drifts off the path only the stretch
+    back to the next path vertex is replanned and spliced in.
+    """
+
+    def __init__(self, planner_worker, config):
+        self.planner = planner_worker
+        self.cruise_altitude = config['mission_altitude']
+        self.arrival_radius = config['mission_arrival_radius']
+        self.lookahead = config['mission_lookahead']
+        self.replan_distance = config['mission_replan_distance']
+        self.gain = config['mission_gain']
+        self.max_tilt = config['mission_max_tilt']
+        self.waypoints = []
+        self.last_plan = {}
+        self.reset()
+
+    def reset(self):
+        """Clear waypoints and path state"""
+        self.waypoints = []
+        self.index = 0
+        self.state = 'idle'
+        self.replans = 0
+        self._clear_path()
+
+    def _clear_path(self):
+        self.path = []
+        self.path_index = 0
+        self.pending = None
+
+    def load(self, waypoints):
+        """Load a new waypoint list ({'x', 'y', 'z'} dicts, z optional)"""
+        self.reset()
+        self.waypoints = [
+            {
+                'x': wp['x'],
+                'y': wp['y'],
+                # Same altitude limits as manual control
+                'z': max(0.5, min(15.0, wp['z'] if wp.get('z') is not None else self.cruise_altitude))
+            }
+            for wp in waypoints
+        ]
+        self.state = 'ready' if self.waypoints else 'idle'
+
+    def resume(self):
+        """Continue with the remaining waypoints, replanning from here"""
+        if self.index >= len(self.waypoints):
+            return False
+        self._clear_path()
+        self.state = 'ready'
+        return True
+
+    def cancel(self):
+        """Stop following; remaining waypoints are kept for resume()"""
+        self._clear_path()
+        if self.state not in ('complete', 'failed'):
+            self.state = 'idle'
+
+    def _request(self, kind, start, goal, rejoin=0):
+        request_id = self.planner.request(start, goal)
+        self.pending = (request_id, kind, rejoin, len(self.path))
+
+    def _poll_planner(self):
+        result = self.planner.get_result()
+        if result is None or self.pending is None:
+            return
+        request_id, kind, rejoin, path_len = self.pending
+        if result['request_id'] != request_id:
+            return  # Stale result for an abandoned request
+        self.pending = None
+        self.last_plan = {k: result[k] for k in ('status', 'expanded', 'length_m', 'planning_ms')}
+
+        if not result['path']:
+            if kind == 'leg':
+                self.state = 'failed'
+            return
+        if kind == 'repair' and len(self.path) == path_len:
+            self.path = result['path'] + self.path[rejoin + 1:]
+        else:
+            self.path = result['path']
+        self.path_index = 0
+        self.state = 'following'
+
+    def _track(self, x, y):
+        """Return (cross-track distance, segment index, segment fraction)"""
+        best = None
+        last = min(len(self.path) - 1, self.path_index + 3)
+        for i in range(self.path_index, last):
+            ax, ay = self.path[i]
+            bx, by = self.path[i + 1]
+            dx = bx - ax
+            dy = by - ay
+            seg2 = dx * dx + dy * dy
+            t = 0.0 if seg2 == 0 else max(0.0, min(1.0, ((x - ax) * dx + (y - ay) * dy) / seg2))
+            d = math.hypot(x - (ax + t * dx), y - (ay + t * dy))
+            if best is None or d < best[0]:
+                best = (d, i, t)
+        return best
+
+    def _carrot(self, i, t):
+        """Point `lookahead` metres further along the path"""
+        remaining = self.lookahead
+        while i < len(self.path) - 1:
+            ax, ay = self.path[i]
+            bx, by = self.path[i + 1]
+            seg = math.hypot(bx - ax, by - ay)
+            left = seg * (1.0 - t)
+            if left >= remaining and seg > 0:
+                t += remaining / seg
+                return (ax + (bx - ax) * t, ay + (by - ay) * t)
+            remaining -= left
+            i += 1
+            t = 0.0
+        return self.path[-1]
+
+    def _steer(self, pid_controller, x, y, yaw, tx, ty, scale):
+        """Convert a world-frame error into roll/pitch disturbances"""
+        ex = tx - x
+        ey = ty - y
+        forward = ex * math.cos(yaw) + ey * math.sin(yaw)
+        left = -ex * math.sin(yaw) + ey * math.cos(yaw)
+        limit = self.max_tilt * scale
+        pid_controller.disturbances['pitch'] = max(-limit, min(limit, -forward * self.gain))
+        pid_controller.disturbances['roll'] = max(-limit, min(limit, left * self.gain))
+        pid_controller.disturbances['yaw'] = 0
+
+    def update(self, position, yaw, pid_controller):
+        """Advance the mission and set PID targets; returns the state"""
+        self._poll_planner()
+        if self.state in ('idle', 'complete', 'failed'):
+            return self.state
+
+        x, y = position[0], position[1]
+        waypoint = self.waypoints[self.index]
+        pid_controller.set_target_altitude(waypoint['z'])
+
+        goal_distance = math.hypot(waypoint['x'] - x, waypoint['y'] - y)
+        if goal_distance < self.arrival_radius:
+            self.index += 1
+            self._clear_path()
+            if self.index >= len(self.waypoints):
+                self.state = 'complete'
+                return self.state
+            self.state = 'ready'
+            waypoint = self.waypoints[self.index]
+
+        if not self.path:
+            # Hold position while the next leg is planned
+            if self.pending is None:
+                self._request('leg', (x, y), (waypoint['x'], waypoint['y']))
+                self.state = 'planning'
+            pid_controller.decay_disturbances(0.85)
+            return self.state
+
+        distance, i, t = self._track(x, y)
+        self.path_index = i
+
+        end_x, end_y = self.path[-1]
+        if self.pending is None:
+            if math.hypot(end_x - x, end_y - y) < self.arrival_radius:
+                # Reached the end of a partial path; plan the rest of the leg
+                self._request('leg', (x, y), (waypoint['x'], waypoint['y']))
+            elif distance > self.replan_distance:
+                rejoin = min(i + 1, len(self.path) - 1)
+                self._request('repair', (x, y), self.path[rejoin], rejoin)
+                self.replans += 1
+
+        tx, ty = self._carrot(i, t)
+        scale = min(1.0, max(0.2, goal_distance / self.lookahead))
+        self._steer(pid_controller, x, y, yaw, tx, ty, scale)
+        return self.state
+
+    def get_status(self):
+        """Mission status for telemetry"""
+        return {
+            'state': self.state,
+            'waypoint': self.index,
+            'waypoints': len(self.waypoints),
+            'path_points': len(self.path),
+            'replans': self.replans,
+            'plan': self.last_plan
+        }
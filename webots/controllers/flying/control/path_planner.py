@@ -0,0 +1,287 @@
+import heapq
+import math
+import multiprocessing
+import queue
+import time
+
+SQRT2 = math.sqrt(2)
+
+# (dx, dy, cost) for 8-connected moves
+NEIGHBOURS = (
+    (1, 0, 1.0), (-1, 0, 1.0), (0, 1, 1.0), (0, -1, 1.0),
+    (1, 1, SQRT2), (1, -1, SQRT2), (-1, 1, SQRT2), (-1, -1, SQRT2)
+)
+
+
+class OccupancyGrid:
+    """2D occupancy grid over the world bounds (1 = blocked)"""
+
+    def __init__(self, bounds, resolution):
+        self.resolution = resolution
+        self.min_x = bounds['min_x']
+        self.min_y = bounds['min_y']
+        self.width = int(math.ceil((bounds['max_x'] - bounds['min_x']) / resolution))
+        self.height = int(math.ceil((bounds['max_y'] - bounds['min_y']) / resolution))
+        self.cells = bytearray(self.width * self.height)
+
+    @classmethod
+    def from_map_data(cls, map_data, resolution, obstacle_radius, clearance):
+        """Rasterize WorldMapper objects into a grid
+
+        obstacle_radius maps an object category to its footprint radius in
+        metres; categories not listed (roads, manholes, ...) are flyable.
+        """
+        grid = cls(map_data['bounds'], resolution)
+        for obj in map_data['objects']:
+            radius = obstacle_radius.get(obj['category'])
+            if radius:
+                pos = obj['position']
+                grid.mark_disc(pos['x'], pos['y'], radius + clearance)
+        return grid
+
+    def mark_disc(self, x, y, radius):
+        """Mark a disc of cells as blocked"""
+        cx, cy = self.to_cell(x, y)
+        r = int(math.ceil(radius / self.resolution))
+        r2 = (radius / self.resolution) ** 2
+        for j in range(max(0, cy - r), min(self.height, cy + r + 1)):
+            for i in range(max(0, cx - r), min(self.width, cx + r + 1)):
+                if (i - cx) ** 2 + (j - cy) ** 2 <= r2:
+                    self.cells[j * self.width + i] = 1
+
+    def to_cell(self, x, y):
+        """World coordinates to (clamped) cell coordinates"""
+        cx = int((x - self.min_x) / self.resolution)
+        cy = int((y - self.min_y) / self.resolution)
+        return (max(0, min(self.width - 1, cx)), max(0, min(self.height - 1, cy)))
+
+    def to_world(self, cx, cy):
+        """Cell coordinates to world coordinates of the cell centre"""
+        return (self.min_x + (cx + 0.5) * self.resolution,
+                self.min_y + (cy + 0.5) * self.resolution)
+
+    def is_free(self, cx, cy):
+        """Check if a cell is inside the grid and not blocked"""
+        return (0 <= cx < self.width and 0 <= cy < self.height
+                and not self.cells[cy * self.width + cx])
+
+    def nearest_free(self, cx, cy, max_radius):
+        """Find the closest free cell within max_radius cells"""
+        if self.is_free(cx, cy):
+            return (cx, cy)
+        for r in range(1, max_radius + 1):
+            for j in range(cy - r, cy + r + 1):
+                for i in range(cx - r, cx + r + 1):
+                    if max(abs(i - cx), abs(j - cy)) == r and self.is_free(i, j):
+                        return (i, j)
+        return None
+
+    def line_of_sight(self, a, b):
+        """Check that the straight segment between two cells is free"""
+        (x0, y0), (x1, y1) = a, b
+        steps = int(max(abs(x1 - x0), abs(y1 - y0)) * 2) + 1
+        for k in range(steps + 1):
+            t = k / steps
+            if not self.is_free(int(round(x0 + (x1 - x0) * t)),
+                                int(round(y0 + (y1 - y0) * t))):
+                return False
+        return True
+
+
+class AStarPlanner:
+    """8-connected A* over an OccupancyGrid with a time budget"""
+
+    def __init__(self, grid, snap_radius=6):
+        self.grid = grid
+        self.snap_radius = snap_radius
+
+    def plan(self, start, goal, time_budget):
+        """Plan from start (x, y) to goal (x, y) in world coordinates
+
+        Returns a dict with 'status' ('ok', 'partial' or 'failed'), the
+        simplified 'path' as a list of (x, y), and search statistics. When
+        the budget runs out the path leads to the explored cell closest to
+        the goal so the drone can keep making progress.
+        """
+        t0 = time.perf_counter()
+        deadline = t0 + time_budget
+        grid = self.grid
+        width = grid.width
+        cells = grid.cells
+
+        start_cell = grid.nearest_free(*grid.to_cell(*start), self.snap_radius)
+        goal_cell = grid.nearest_free(*grid.to_cell(*goal), self.snap_radius)
+        if start_cell is None or goal_cell is None:
+            return self._result('failed', [], 0, t0)
+
+        gx, gy = goal_cell
+        s = start_cell[1] * width + start_cell[0]
+        g = gy * width + gx
+
+        def heuristic(cx, cy):
+            dx = abs(cx - gx)
+            dy = abs(cy - gy)
+            return dx + dy + (SQRT2 - 2) * min(dx, dy)
+
+        h0 = heuristic(*start_cell)
+        g_score = {s: 0.0}
+        came_from = {s: -1}
+        # Ties on f are broken on h so open terrain expands close to the path
+        open_heap = [(h0, h0, s)]
+        best = (h0, s)
+        expanded = 0
+        status = 'failed'
+
+        while open_heap:
+            f, h, current = heapq.heappop(open_heap)
+            cost = g_score[current]
+            if f - h > cost + 1e-9:
+                continue  # Stale entry
+            if current == g:
+                status = 'ok'
+                break
+
+            expanded += 1
+            if h < best[0]:
+                best = (h, current)
+            if expanded & 1023 == 0 and time.perf_counter() > deadline:
+                status = 'partial'
+                break
+
+            cx = current % width
+            cy = current // width
+            for dx, dy, step in NEIGHBOURS:
+                nx = cx + dx
+                ny = cy + dy
+                if nx < 0 or ny < 0 or nx >= width or ny >= grid.height:
+                    continue
+                n = ny * width + nx
+                if cells[n]:
+                    continue
+                # No corner cutting past blocked cells
+                if dx and dy and (cells[cy * width + nx] or cells[ny * width + cx]):
+                    continue
+                new_cost = cost + step
+                if new_cost < g_score.get(n, math.inf):
+                    g_score[n] = new_cost
+                    came_from[n] = current
+                    nh = heuristic(nx, ny)
+                    heapq.heappush(open_heap, (new_cost + nh, nh, n))
+
+        if status == 'failed' and best[1] != s:
+            status = 'partial'
+        end = g if status == 'ok' else best[1]
+        if status == 'failed':
+            return self._result(status, [], expanded, t0)
+
+        chain = []
+        while end != -1:
+            chain.append((end % width, end // width))
+            end = came_from[end]
+        chain.reverse()
+
+        path = [grid.to_world(cx, cy) for cx, cy in self._simplify(chain)]
+        path[0] = (start[0], start[1])
+        if status == 'ok':
+            path[-1] = (goal[0], goal[1])
+        if len(path) == 1:
+            path.append(path[0])
+        return self._result(status, path, expanded, t0)
+
+    def _simplify(self, chain):
+        """Drop cells that are reachable in a straight line"""
+        if len(chain) <= 2:
+            return chain
+        simplified = [chain[0]]
+        anchor = chain[0]
+        for i in range(2, len(chain)):
+            if not self.grid.line_of_sight(anchor, chain[i]):
+                anchor = chain[i - 1]
+                simplified.append(anchor)
+        simplified.append(chain[-1])
+        return simplified
+
+    def _result(self, status, path, expanded, t0):
+        length = sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(path, path[1:]))
+        return {
+            'status': status,
+            'path': path,
+            'expanded': expanded,
+            'length_m': round(length, 2),
+            'planning_ms': round((time.perf_counter() - t0) * 1000.0, 2)
+        }
+
+
+def _planner_worker(planner, time_budget, requests, results):
+    """Worker process: answer planning requests, newest first"""
+    while True:
+        request = requests.get()
+        # Skip requests that were superseded while we were busy
+        while request is not None:
+            try:
+                request = requests.get_nowait()
+            except queue.Empty:
+                break
+        if request is None:
+            break
+
+        request_id, start, goal = request
+        try:
+            result = planner.plan(start, goal, time_budget)
+        except Exception:
+            result = {'status': 'failed', 'path': [], 'expanded': 0,
+                      'length_m': 0.0, 'planning_ms': 0.0}
+        result['request_id'] = request_id
+        results.put(result)
+
+
+class PlannerWorker:
+    """Runs planning requests in a worker process
+
+    The A* search is pure Python, so it runs outside the controller
+    process to keep it off the control loop's GIL. The grid is handed over
+    once at start; the control loop submits requests and polls for results
+    without ever blocking, and a newer request supersedes any that are
+    still queued.
+    """
+
+    def __init__(self, planner, time_budget):
+        self._requests = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._next_id = 0
+        self._process = multiprocessing.Process(
+            target=_planner_worker,
+            args=(planner, time_budget, self._requests, self._results),
+            daemon=True
+        )
+        self.stats = {'requests': 0, 'completed': 0, 'last_ms': 0.0, 'max_ms': 0.0}
+
+    def start(self):
+        """Start the worker process"""
+        self._process.start()
+
+    def request(self, start, goal):
+        """Queue a planning request and return its id"""
+        self._next_id += 1
+        self._requests.put((self._next_id, start, goal))
+        self.stats['requests'] += 1
+        return self._next_id
+
+    def get_result(self):
+        """Get the newest finished result (non-blocking)"""
+        result = None
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                return result
+            self.stats['completed'] += 1
+            self.stats['last_ms'] = result['planning_ms']
+            self.stats['max_ms'] = max(self.stats['max_ms'], result['planning_ms'])
+
+    def close(self):
+        """Stop the worker process"""
+        self._requests.put(None)
+        self._process.join(timeout=1.0)
+        if self._process.is_alive():
+            self._process.terminate()
@@ -0,0 +1,161 @@
+import math
+
+import numpy as np
+
+# State layout: position (3), velocity (3), roll/pitch/yaw (3), gyro bias (3)
+N = 12
+ROLL, PITCH, YAW = 6, 7, 8
+
+
+class StateEstimator:
+    """Extended Kalman filter fusing GPS, IMU attitude and gyro rates
+
+    Position and velocity follow a constant-velocity model corrected by
+    GPS; attitude is propagated from bias-corrected gyro rates through the
+    roll/pitch/yaw kinematics and corrected by the inertial unit. All
+    matrices are allocated once, measurements are applied one scalar at a
+    time (no matrix inversion) and update() only does in-place NumPy work.
+    """
+
+    def __init__(self, config):
+        self.r_gps = config['ekf_gps_noise'] ** 2
+        self.r_attitude = config['ekf_attitude_noise'] ** 2
+        self.q_rates = np.array(
+            [config['ekf_position_noise'] ** 2] * 3 +
+            [config['ekf_accel_noise'] ** 2] * 3 +
+            [config['ekf_gyro_noise'] ** 2] * 3 +
+            [config['ekf_bias_noise'] ** 2] * 3
+        )
+
+        self.x = np.zeros(N)
+        self.P = np.eye(N)
+        self.F = np.eye(N)
+        self.Q = np.zeros((N, N))
+        self._q_dt = None
+
+        # Scratch buffers and views reused by every update
+        self._FP = np.empty((N, N))
+        self._outer = np.empty((N, N))
+        self._gain = np.empty(N)
+        self._row = np.empty(N)
+        self._step = np.empty(N)
+        self._columns = [self.P[:, i] for i in range(N)]
+        self._F_T = self.F.T
+        self._P_T = self.P.T
+
+        self.initialized = False
+
+    def reset(self, position, orientation):
+        """Initialise the state from raw sensor readings"""
+        self.x[:] = 0.0
+        self.x[0:3] = (position['x'], position['y'], position['z'])
+        self.x[ROLL:YAW + 1] = (orientation['roll'], orientation['pitch'], orientation['yaw'])
+        self.P[:] = 0.0
+        for i, variance in enumerate([1.0] * 3 + [1.0] * 3 + [0.1] * 3 + [0.01] * 3):
+            self.P[i, i] = variance
+        self.initialized = True
+
+    def _set_process_noise(self, dt):
+        if dt != self._q_dt:
+            np.fill_diagonal(self.Q, self.q_rates * dt)
+            self._q_dt = dt
+
+    def predict(self, gyro, dt):
+        """Propagate state and covariance over dt seconds"""
+        x = self.x
+        F = self.F
+
+        roll = float(x[ROLL])
+        pitch = float(x[PITCH])
+        p = gyro['roll_velocity'] - x[9]
+        q = gyro['pitch_velocity'] - x[10]
+        r = gyro['yaw_velocity'] - x[11]
+
+        sr, cr = math.sin(roll), math.cos(roll)
+        cp = math.cos(pitch)
+        if abs(cp) < 1e-3:
+            cp = math.copysign(1e-3, cp)
+        tp = math.sin(pitch) / cp
+        qs_rc = q * sr + r * cr
+        qc_rs = q * cr - r * sr
+
+        # Euler angle kinematics
+        x[0] += x[3] * dt
+        x[1] += x[4] * dt
+        x[2] += x[5] * dt
+        x[ROLL] += (p + qs_rc * tp) * dt
+        x[PITCH] += qc_rs * dt
+        x[YAW] += (qs_rc / cp) * dt
+        x[YAW] = (x[YAW] + math.pi) % (2 * math.pi) - math.pi
+
+        # Jacobian (constant entries are already in place)
+        F[0, 3] = F[1, 4] = F[2, 5] = dt
+        F[ROLL, ROLL] = 1.0 + qc_rs * tp * dt
+        F[ROLL, PITCH] = qs_rc / (cp * cp) * dt
+        F[PITCH, ROLL] = -qs_rc * dt
+        F[YAW, ROLL] = qc_rs / cp * dt
+        F[YAW, PITCH] = qs_rc * tp / cp * dt
+        # d(angle rates) / d(gyro bias) = -T(roll, pitch)
+        F[ROLL, 9] = -dt
+        F[ROLL, 10] = -sr * tp * dt
+        F[ROLL, 11] = -cr * tp * dt
+        F[PITCH, 10] = -cr * dt
+        F[PITCH, 11] = sr * dt
+        F[YAW, 10] = -sr / cp * dt
+        F[YAW, 11] = -cr / cp * dt
+
+        self._set_process_noise(dt)
+        np.dot(F, self.P, out=self._FP)
+        np.dot(self._FP, self._F_T, out=self.P)
+        np.add(self.P, self.Q, out=self.P)
+
+    def _update_scalar(self, i, z, variance, angle=False):
+        """Kalman update for a direct measurement of state i"""
+        P = self.P
+        innovation = z - self.x[i]
+        if angle:
+            innovation = (innovation + math.pi) % (2 * math.pi) - math.pi
+        s = P[i, i] + variance
+
+        np.divide(self._columns[i], s, out=self._gain)
+        np.copyto(self._row, self._columns[i])
+        np.multiply(self._gain, innovation, out=self._step)
+        np.add(self.x, self._step, out=self.x)
+        np.multiply.outer(self._gain, self._row, out=self._outer)
+        np.subtract(P, self._outer, out=P)
+
+    def update(self, position, orientation, gyro, dt):
+        """Run one predict/correct cycle with the latest sensor readings"""
+        if not self.initialized:
+            self.reset(position, orientation)
+            return
+
+        self.predict(gyro, dt)
+
+        self._update_scalar(0, position['x'], self.r_gps)
+        self._update_scalar(1, position['y'], self.r_gps)
+        self._update_scalar(2, position['z'], self.r_gps)
+        self._update_scalar(ROLL, orientation['roll'], self.r_attitude, angle=True)
+        self._update_scalar(PITCH, orientation['pitch'], self.r_attitude, angle=True)
+        self._update_scalar(YAW, orientation['yaw'], self.r_attitude, angle=True)
+        self.x[YAW] = (self.x[YAW] + math.pi) % (2 * math.pi) - math.pi
+
+        # Keep P symmetric against round-off
+        np.add(self.P, self._P_T, out=self._FP)
+        np.multiply(self._FP, 0.5, out=self.P)
+
+    def get_position(self):
+        """Estimated position"""
+        return {'x': float(self.x[0]), 'y': float(self.x[1]), 'z': float(self.x[2])}
+
+    def get_velocity(self):
+        """Estimated velocity in the world frame"""
+        return {'x': float(self.x[3]), 'y': float(self.x[4]), 'z': float(self.x[5])}
+
+    def get_orientation(self):
+        """Estimated roll, pitch, yaw"""
+        return {
+            'roll': float(self.x[ROLL]),
+            'pitch': float(self.x[PITCH]),
+            'yaw': float(self.x[YAW])
+        }
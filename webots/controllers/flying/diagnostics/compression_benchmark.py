@@ -0,0 +1,190 @@
+"""Loopback benchmark for WebSocket compression policies
+
+Publishes camera frames and telemetry to several local clients under each
+compression setting and reports server CPU per client and bytes on the
+wire (counted by a TCP proxy between the clients and the server).
+
+Run from the controller directory:
+    python -m diagnostics.compression_benchmark [clients] [seconds]
+"""
+import asyncio
+import base64
+import io
+import json
+import multiprocessing
+import random
+import sys
+import time
+
+import websockets
+from PIL import Image
+
+from communication.compression import CompressionPolicy
+from communication.telemetry import TelemetryFormatter
+from communication.websocket_server import WebSocketServer
+
+SUBSCRIPTIONS = {'camera': None, 'telemetry': None, 'map': None}
+
+
+def camera_data():
+    """Camera data with a JPEG of a textured synthetic scene"""
+    gradient = Image.linear_gradient('L').resize((400, 240)).convert('RGB')
+    noise = Image.effect_noise((400, 240), 40).convert('RGB')
+    img = Image.blend(gradient, noise, 0.4)
+    buffer = io.BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    return {
+        'width': 400,
+        'height': 240,
+        'data': base64.b64encode(buffer.getvalue()).decode('utf-8'),
+        'active': 'front',
+        'resolution': '400x240',
+        'fps': 30.0
+    }
+
+
+def telemetry_data():
+    """Telemetry with realistic fields and varying values"""
+    r = random.random
+    return {
+        'altitude': round(2 + r(), 2),
+        'target': 2.0,
+        'roll': round(r() - 0.5, 2),
+        'pitch': round(r() - 0.5, 2),
+        'yaw': round(r() * 6 - 3, 2),
+        'heading': round(r() * 360, 1),
+        'gps': {'lat': round(r() * 10, 6), 'lon': round(r() * 10, 6), 'alt': round(2 + r(), 2)},
+        'battery': round(90 + r(), 1),
+        'signal_strength': 95,
+        'temperatures': {
+            'body': round(40 + r(), 1),
+            'motors': {m: round(55 + r(), 1) for m in ('fl', 'fr', 'rl', 'rr')}
+        },
+        'wind_speed': round(5 + r() * 5, 1),
+        'flight_mode': 'manual',
+        'mission': {'state': 'idle', 'waypoint': 0, 'waypoints': 0, 'path_points': 0,
+                    'replans': 0, 'plan': {}},
+        'velocity': {'x': round(r(), 2), 'y': round(r(), 2), 'z': round(r(), 2)},
+        'ground_velocity': None
+    }
+
+
+def map_data(count=300):
+    """Map data with many objects"""
+    random.seed(0)
+    categories = ['tree', 'building', 'windmill', 'vehicle', 'road', 'container']
+    return {
+        'bounds': {'min_x': -200, 'max_x': 200, 'min_y': -200, 'max_y': 200},
+        'objects': [
+            {
+                'name': f'object({i})',
+                'type': 'Pine',
+                'category': random.choice(categories),
+                'position': {'x': round(random.uniform(-200, 200), 2),
+                             'y': round(random.uniform(-200, 200), 2),
+                             'z': 0.0}
+            }
+            for i in range(count)
+        ]
+    }
+
+
+async def _clients(port, proxy_port, clients, seconds, results):
+    wire = {'bytes': 0}
+
+    async def pipe(reader, writer, count):
+        try:
+            while data := await reader.read(65536):
+                if count:
+                    wire['bytes'] += len(data)
+                writer.write(data)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def proxy(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection('localhost', port)
+        await asyncio.gather(pipe(client_reader, server_writer, False),
+                             pipe(server_reader, client_writer, True))
+
+    counts = {}
+
+    async def client():
+        async with websockets.connect(f'ws://localhost:{proxy_port}', max_size=None) as ws:
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                try:
+                    message = await asyncio.wait_for(ws.recv(), 0.5)
+                except asyncio.TimeoutError:
+                    continue
+                msg_type = json.loads(message)['type']
+                counts[msg_type] = counts.get(msg_type, 0) + 1
+
+    proxy_server = await asyncio.start_server(proxy, 'localhost', proxy_port)
+    async with proxy_server:
+        await asyncio.gather(*(client() for _ in range(clients)))
+    results.put({'bytes': wire['bytes'], 'messages': counts})
+
+
+def run_clients(port, proxy_port, clients, seconds, results):
+    asyncio.run(_clients(port, proxy_port, clients, seconds, results))
+
+
+def bench(name, compression, port, clients, seconds, camera, map_info):
+    server = WebSocketServer('localhost', port, default_subscriptions=SUBSCRIPTIONS,
+                             compression=compression)
+    server.send_map_data(map_info)
+    server.start()
+    time.sleep(0.3)
+
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=run_clients, args=(port, port + 1, clients, seconds, results))
+    process.start()
+    while len(server.clients) < clients:
+        time.sleep(0.01)
+
+    cpu_start = time.process_time()
+    start = time.monotonic()
+    next_camera = next_telemetry = start
+    while time.monotonic() - start < seconds - 0.5:
+        now = time.monotonic()
+        if now >= next_camera:
+            server.publish('camera', camera, now)
+            next_camera += 1 / 30
+        if now >= next_telemetry:
+            server.publish('telemetry', telemetry_data(), now)
+            next_telemetry += 1 / 60
+        time.sleep(0.002)
+    elapsed = time.monotonic() - start
+    cpu = time.process_time() - cpu_start
+
+    result = results.get()
+    process.join()
+    per_client_s = clients * elapsed
+    print(f"{name:<10} cpu {cpu / per_client_s * 1000:7.1f} ms/client/s   "
+          f"wire {result['bytes'] / per_client_s / 1024:8.1f} KiB/client/s   "
+          f"messages {result['messages']}")
+
+
+def main(clients=4, seconds=5.0):
+    camera = camera_data()
+    camera_size = len(TelemetryFormatter.create_message('camera', camera, 0.0, 1))
+    map_info = map_data()
+    map_size = len(json.dumps({'type': 'map_data', 'data': map_info}))
+    print(f"camera message {camera_size} bytes, map message {map_size} bytes, "
+          f"{clients} clients, {seconds:.0f} s each")
+    policies = [
+        ('none', None),
+        ('deflate', 'deflate'),
+        ('policy', CompressionPolicy()),
+    ]
+    for i, (name, compression) in enumerate(policies):
+        bench(name, compression, 8900 + 2 * i, clients, seconds, camera, map_info)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 4, float(args[1]) if len(args) > 1 else 5.0)
@@ -0,0 +1,115 @@
+"""Offline benchmark for the state estimator
+
+Flies a synthetic trajectory with noisy GPS, IMU and gyro readings and
+reports the per-update cost, per-update NumPy allocations and the RMS
+error of the raw sensors and of the estimate against the true state.
+
+Run from the controller directory:
+    python -m diagnostics.estimator_benchmark
+"""
+import math
+import random
+import statistics
+import time
+import tracemalloc
+
+from config import CONFIG
+from control.state_estimator import StateEstimator
+
+
+def trajectory(t):
+    """True position, velocity and attitude of a climbing circle"""
+    w = 0.2
+    position = {'x': 10 * math.cos(w * t), 'y': 10 * math.sin(w * t), 'z': 2 + 0.1 * t}
+    velocity = {'x': -10 * w * math.sin(w * t), 'y': 10 * w * math.cos(w * t), 'z': 0.1}
+    orientation = {
+        'roll': 0.1 * math.sin(0.7 * t),
+        'pitch': 0.08 * math.cos(0.5 * t),
+        'yaw': (w * t + math.pi / 2 + math.pi) % (2 * math.pi) - math.pi
+    }
+    return position, velocity, orientation
+
+
+def body_rates(t, dt):
+    """Gyro rates matching trajectory() by finite differences"""
+    _, _, a = trajectory(t)
+    _, _, b = trajectory(t + dt)
+    d_roll = (b['roll'] - a['roll']) / dt
+    d_pitch = (b['pitch'] - a['pitch']) / dt
+    d_yaw = ((b['yaw'] - a['yaw'] + math.pi) % (2 * math.pi) - math.pi) / dt
+    sr, cr = math.sin(a['roll']), math.cos(a['roll'])
+    sp, cp = math.sin(a['pitch']), math.cos(a['pitch'])
+    return {
+        'roll_velocity': d_roll - sp * d_yaw,
+        'pitch_velocity': cr * d_pitch + sr * cp * d_yaw,
+        'yaw_velocity': -sr * d_pitch + cr * cp * d_yaw
+    }
+
+
+def readings(steps, dt, gps_noise, attitude_noise, gyro_noise, gyro_bias):
+    """Precomputed (truth, gps, imu, gyro) per step"""
+    random.seed(1)
+    data = []
+    for k in range(steps):
+        t = k * dt
+        true_position, true_velocity, true_orientation = trajectory(t)
+        gps = {key: v + random.gauss(0, gps_noise) for key, v in true_position.items()}
+        imu = {key: v + random.gauss(0, attitude_noise) for key, v in true_orientation.items()}
+        gyro = {key: v + gyro_bias + random.gauss(0, gyro_noise)
+                for key, v in body_rates(t - dt, dt).items()}
+        data.append(((true_position, true_velocity, true_orientation), gps, imu, gyro))
+    return data
+
+
+def main(steps=20000, dt=0.008, gps_noise=0.2, attitude_noise=0.01, gyro_noise=0.02, gyro_bias=0.01):
+    data = readings(steps, dt, gps_noise, attitude_noise, gyro_noise, gyro_bias)
+
+    # Timing pass
+    estimator = StateEstimator(CONFIG)
+    durations = []
+    errors = {'raw_position': 0.0, 'position': 0.0, 'velocity': 0.0,
+              'raw_attitude': 0.0, 'attitude': 0.0}
+    samples = 0
+    for k, (truth, gps, imu, gyro) in enumerate(data):
+        start = time.perf_counter()
+        estimator.update(gps, imu, gyro, dt)
+        durations.append(time.perf_counter() - start)
+
+        true_position, true_velocity, true_orientation = truth
+        if k > steps // 10:  # Skip convergence
+            position = estimator.get_position()
+            velocity = estimator.get_velocity()
+            orientation = estimator.get_orientation()
+            for key in 'xyz':
+                errors['raw_position'] += (gps[key] - true_position[key]) ** 2
+                errors['position'] += (position[key] - true_position[key]) ** 2
+                errors['velocity'] += (velocity[key] - true_velocity[key]) ** 2
+            for key in ('roll', 'pitch', 'yaw'):
+                raw = (imu[key] - true_orientation[key] + math.pi) % (2 * math.pi) - math.pi
+                est = (orientation[key] - true_orientation[key] + math.pi) % (2 * math.pi) - math.pi
+                errors['raw_attitude'] += raw * raw
+                errors['attitude'] += est * est
+            samples += 1
+
+    # Allocation pass
+    estimator = StateEstimator(CONFIG)
+    estimator.update(data[0][1], data[0][2], data[0][3], dt)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for _, gps, imu, gyro in data[1:]:
+        estimator.update(gps, imu, gyro, dt)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    durations.sort()
+    print(f"updates: {steps}")
+    print(f"update cost: mean {statistics.mean(durations) * 1e6:.1f} us, "
+          f"p99 {durations[int(len(durations) * 0.99)] * 1e6:.1f} us, "
+          f"max {durations[-1] * 1e6:.1f} us (control step {dt * 1000:.0f} ms)")
+    print(f"net memory retained over {steps} updates: {allocated} bytes")
+    for key, total in errors.items():
+        print(f"rms {key}: {math.sqrt(total / samples):.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import math
+
+
+class EstimatorMonitor:
+    """Tracks state estimator cost and its error against Supervisor ground truth
+
+    Errors are accumulated as RMS for both the estimate and the raw
+    sensor readings so the two can be compared directly.
+    """
+
+    def __init__(self, robot_node):
+        self.node = robot_node
+        self.updates = 0
+        self.update_total = 0.0
+        self.update_max = 0.0
+        self.samples = 0
+        self.errors = {
+            'estimate': {'position': 0.0, 'velocity': 0.0, 'attitude': 0.0},
+            'raw': {'position': 0.0, 'attitude': 0.0}
+        }
+
+    def record_update(self, seconds):
+        """Record the duration of one estimator update"""
+        self.updates += 1
+        self.update_total += seconds
+        self.update_max = max(self.update_max, seconds)
+
+    def _true_attitude(self):
+        # Rotation matrix (row-major) to roll/pitch/yaw, R = Rz(yaw) Ry(pitch) Rx(roll)
+        m = self.node.getOrientation()
+        return (
+            math.atan2(m[7], m[8]),
+            -math.asin(max(-1.0, min(1.0, m[6]))),
+            math.atan2(m[3], m[0])
+        )
+
+    @staticmethod
+    def _attitude_error(orientation, truth):
+        total = 0.0
+        for key, true_angle in zip(('roll', 'pitch', 'yaw'), truth):
+            diff = (orientation[key] - true_angle + math.pi) % (2 * math.pi) - math.pi
+            total += diff * diff
+        return total
+
+    def compare(self, estimator, raw_position, raw_orientation):
+        """Accumulate squared errors for the current step"""
+        true_position = self.node.getPosition()
+        true_velocity = self.node.getVelocity()
+        true_attitude = self._true_attitude()
+
+        position = estimator.get_position()
+        velocity = estimator.get_velocity()
+        estimate = self.errors['estimate']
+        raw = self.errors['raw']
+
+        estimate['position'] += sum((position[k] - t) ** 2 for k, t in zip('xyz', true_position))
+        estimate['velocity'] += sum((velocity[k] - t) ** 2 for k, t in zip('xyz', true_velocity[:3]))
+        estimate['attitude'] += self._attitude_error(estimator.get_orientation(), true_attitude)
+        raw['position'] += sum((raw_position[k] - t) ** 2 for k, t in zip('xyz', true_position))
+        raw['attitude'] += self._attitude_error(raw_orientation, true_attitude)
+        self.samples += 1
+
+    def get_stats(self):
+        """Update cost and RMS errors for the stats topic"""
+        stats = {
+            'updates': self.updates,
+            'update_us_mean': round(self.update_total / self.updates * 1e6, 1) if self.updates else 0.0,
+            'update_us_max': round(self.update_max * 1e6, 1),
+            'samples': self.samples
+        }
+        if self.samples:
+            for source, errors in self.errors.items():
+                stats[source + '_rms'] = {
+                    key: round(math.sqrt(total / self.samples), 4)
+                    for key, total in errors.items()
+                }
+        return stats
@@ -0,0 +1,96 @@
+import collections
+import os
+import sys
+import threading
+
+
+class SamplingProfiler:
+    """Samples the stacks of registered threads into collapsed-stack counts
+
+    Nothing runs while the profiler is stopped. Once max_samples stacks
+    have been recorded it stops itself, so the buffer stays bounded.
+    """
+
+    def __init__(self, interval=0.005, max_samples=50000, max_depth=64):
+        self.interval = interval
+        self.max_samples = max_samples
+        self.max_depth = max_depth
+        self.threads = {}  # thread ident -> name
+        self._lock = threading.Lock()
+        self._stacks = collections.Counter()
+        self._samples = 0
+        self._thread = None
+        self._stop = threading.Event()
+
+    def add_thread(self, name, ident):
+        """Register a thread to be sampled"""
+        self.threads[ident] = name
+
+    def is_running(self):
+        """Check if the sampler thread is active"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        """Clear previous samples and start sampling"""
+        if self.is_running():
+            return False
+        if interval:
+            self.interval = max(0.001, interval)
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """Stop sampling (samples are kept until the next start)"""
+        if not self.is_running():
+            return False
+        self._stop.set()
+        self._thread.join(timeout=1.0)
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident, name in list(self.threads.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stack.append(name)
+                stack.reverse()
+                with self._lock:
+                    self._stacks[';'.join(stack)] += 1
+                    self._samples += 1
+                    full = self._samples >= self.max_samples
+                if full:
+                    return
+            del frames
+
+    def get_status(self):
+        """Profiler state for status replies"""
+        return {
+            'running': self.is_running(),
+            'samples': self._samples,
+            'max_samples': self.max_samples,
+            'interval_ms': round(self.interval * 1000.0, 2)
+        }
+
+    def collapsed(self):
+        """Samples in collapsed-stack format (one 'a;b;c count' per line)"""
+        with self._lock:
+            items = sorted(self._stacks.items())
+        return ''.join(f"{stack} {count}\n" for stack, count in items)
+
+    def write(self, path):
+        """Write collapsed stacks to a file"""
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+        return path
@@ -0,0 +1,106 @@
+"""Loopback check that resuming clients never stall camera capture
+
+Runs a control loop that captures camera frames through a CaptureScheduler
+gated on delivery, while a client repeatedly drops its connection and
+resumes with ?resume. Every cycle must still receive new camera frames.
+
+Run from the controller directory:
+    python -m diagnostics.resume_check [cycles]
+"""
+import asyncio
+import json
+import sys
+import threading
+import time
+
+import websockets
+
+from communication.websocket_server import WebSocketServer
+from perception.capture_scheduler import CaptureScheduler
+
+PORT = 8980
+SUBSCRIPTIONS = {'camera': None, 'telemetry': None, 'events': None}
+
+
+def control_loop(server, capture, stop):
+    """Publish camera frames as the scheduler allows, telemetry every step"""
+    step = 0
+    while not stop.is_set():
+        step += 1
+        now = time.monotonic()
+        if (server.has_subscribers('camera') and
+                capture.should_capture(server.is_delivered('camera'),
+                                       server.topic_rates.get('camera'))):
+            capture.record_capture(now)
+            server.publish('camera', {'frame': step, 'data': 'x' * 2000}, now)
+        if step % 2 == 0 and server.should_publish('telemetry'):
+            server.publish('telemetry', {'step': step}, now)
+        time.sleep(0.008)
+
+
+async def client(cycles, period):
+    """Connect once, then drop and resume; return camera frames per cycle"""
+    last_seq = {}
+    state = {'epoch': None}
+    frames = []
+
+    async def receive(ws, seconds, drop_early=False):
+        count = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            try:
+                message = json.loads(await asyncio.wait_for(ws.recv(), 0.05))
+            except asyncio.TimeoutError:
+                continue
+            if message['type'] in ('hello', 'resume'):
+                state['epoch'] = message['epoch']
+            if 'seq' in message and message['type'] in SUBSCRIPTIONS:
+                last_seq[message['type']] = message['seq']
+            if message['type'] == 'camera':
+                count += 1
+                if drop_early and count > 3:
+                    break  # Drop right after a frame, often before the next is sent
+        return count
+
+    async with websockets.connect(f'ws://localhost:{PORT}') as ws:
+        frames.append(await receive(ws, period))
+    for cycle in range(cycles):
+        async with websockets.connect(f'ws://localhost:{PORT}/?resume') as ws:
+            await ws.send(json.dumps({
+                'type': 'resume',
+                'epoch': state['epoch'],
+                'last_seq': last_seq
+            }))
+            frames.append(await receive(ws, period, drop_early=cycle % 2 == 1))
+    return frames
+
+
+def main(cycles=30):
+    server = WebSocketServer('localhost', PORT, default_subscriptions=SUBSCRIPTIONS,
+                             replay_sizes={'events': 256})
+    server.start()
+    time.sleep(0.3)
+
+    capture = CaptureScheduler(30.0, 0.008)
+    stop = threading.Event()
+    loop = threading.Thread(target=control_loop, args=(server, capture, stop), daemon=True)
+    loop.start()
+    try:
+        frames = asyncio.run(client(cycles, 0.5))
+    finally:
+        stop.set()
+        loop.join()
+
+    stalled = [i for i, count in enumerate(frames) if count == 0]
+    print(f"camera frames per cycle: {frames}")
+    print(f"capture stats: {capture.get_stats()}")
+    if stalled:
+        print(f"FAIL: no camera frames in cycles {stalled}")
+        return 1
+    print(f"OK: camera kept flowing through {cycles} resumes")
+    return 0
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    sys.exit(main(int(args[0]) if args else 30))
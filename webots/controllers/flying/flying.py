@@ -1,15 +1,26 @@
 from controller import Supervisor
 import logging
+import math
+import threading
+import time
 
 from config import CONFIG
 from hardware.sensors import SensorManager
 from hardware.actuators import MotorController
 from control.pid_controller import PIDController
 from control.flight_modes import FlightModeManager
+from control.mission import MissionManager
+from control.path_planner import OccupancyGrid, AStarPlanner, PlannerWorker
+from control.state_estimator import StateEstimator
 from communication.websocket_server import WebSocketServer
+from communication.compression import CompressionPolicy
 from communication.telemetry import TelemetryFormatter
 from perception.camera_processor import CameraProcessor
+from perception.capture_scheduler import CaptureScheduler
 from perception.world_mapper import WorldMapper
+from perception.optical_flow import OpticalFlowEstimator
+from diagnostics.profiler import SamplingProfiler
+from diagnostics.estimator_monitor import EstimatorMonitor
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -27,28 +38,104 @@ def main():
     sensors = SensorManager(robot, timestep)
     motors = MotorController(robot)
     pid = PIDController(CONFIG)
-    flight_mode = FlightModeManager()
+    estimator = StateEstimator(CONFIG)
+    estimator_monitor = EstimatorMonitor(robot.getSelf())
+    step_seconds = timestep / 1000.0
+    
+    # Path planning runs in a worker process so it never holds the control loop's GIL
+    grid = OccupancyGrid.from_map_data(
+        map_data,
+        CONFIG['planner_resolution'],
+        CONFIG['planner_obstacle_radius'],
+        CONFIG['planner_clearance']
+    )
+    planner = PlannerWorker(AStarPlanner(grid), CONFIG['planner_time_budget'])
+    planner.start()
+    mission = MissionManager(planner, CONFIG)
+    flight_mode = FlightModeManager(mission)
     camera_proc = CameraProcessor(CONFIG)
-    websocket = WebSocketServer(CONFIG['host'], CONFIG['port'])
+    capture = CaptureScheduler(CONFIG['camera_target_fps'], step_seconds)
+    camera_dimensions = sensors.get_camera_dimensions()
+    optical_flow = OpticalFlowEstimator(
+        camera_dimensions['width'],
+        camera_dimensions['height'],
+        sensors.get_camera_fov(),
+        CONFIG
+    )
+    optical_flow.start()
+    if CONFIG['compression'] == 'policy':
+        compression = CompressionPolicy(
+            CONFIG['compression_uncompressed'],
+            CONFIG['compression_level'],
+            CONFIG['compression_window_bits'],
+            CONFIG['compression_mem_level']
+        )
+    else:
+        compression = CONFIG['compression']
+    websocket = WebSocketServer(
+        CONFIG['host'],
+        CONFIG['port'],
+        CONFIG['command_budget'],
+        CONFIG['default_subscriptions'],
+        compression,
+        CONFIG['replay_buffer']
+    )
+    command_bus = websocket.command_bus
+    
+    # State changes go out on the 'events' topic and are kept for resuming clients
+    alerts = {}
+    
+    def publish_event(event):
+        websocket.publish('events', event, robot.getTime())
+        websocket.set_snapshot({
+            'flight_mode': flight_mode.get_mode(),
+            'camera': camera_proc.active_camera,
+            'mission': mission.state,
+            'alerts': list(alerts.values())
+        }, robot.getTime())
+    
+    def raise_alert(name, **details):
+        alerts[name] = dict(details, alert=name)
+        publish_event(dict(details, event='alert', alert=name))
+    
+    # Set up command handlers (run on this thread when the bus is drained)
+    latest_command = {'data': None}
+    
+    def on_motor_command(command):
+        latest_command['data'] = command
     
-    # Set up callbacks
     def on_flight_mode_change(mode):
-        flight_mode.set_mode(mode)
+        ok = flight_mode.set_mode(mode)
+        publish_event({'event': 'ack', 'command': 'flight_mode', 'value': mode, 'ok': ok})
+    
+    def on_mission(waypoints):
+        mission.load(waypoints)
+        ok = flight_mode.set_mode('mission')
+        publish_event({'event': 'ack', 'command': 'mission', 'value': len(waypoints), 'ok': ok})
     
     def on_camera_switch(camera):
-        camera_proc.set_active_camera(camera)
+        ok = camera_proc.set_active_camera(camera)
+        publish_event({'event': 'ack', 'command': 'camera_switch', 'value': camera, 'ok': ok})
     
-    def on_camera_control(pitch, yaw):
+    def on_camera_control(angles):
         """Handle manual camera gimbal control"""
-        motors.set_camera_angle(pitch, yaw)
+        motors.set_camera_angle(angles['pitch'], angles['yaw'])
     
-    websocket.set_flight_mode_callback(on_flight_mode_change)
-    websocket.set_camera_switch_callback(on_camera_switch)
-    websocket.set_camera_control_callback(on_camera_control)
+    command_bus.register('motor_command', on_motor_command)
+    command_bus.register('flight_mode', on_flight_mode_change)
+    command_bus.register('mission', on_mission)
+    command_bus.register('camera_switch', on_camera_switch)
+    command_bus.register('camera_control', on_camera_control)
     
     # Start WebSocket server
     websocket.start()
     
+    # Sampling profiler, idle until started by a 'profiler' message
+    profiler = SamplingProfiler(CONFIG['profiler_interval'], CONFIG['profiler_max_samples'])
+    profiler.add_thread('control', threading.get_ident())
+    profiler.add_thread('websocket', websocket.thread.ident)
+    websocket.set_profiler(profiler, CONFIG['profiler_output_dir'])
+    
     # Send initial map data
     websocket.send_map_data(map_data)
     
@@ -57,36 +144,68 @@ def main():
     
     # Get initial position
     initial_position = sensors.get_position()
+    estimator.reset(initial_position, sensors.get_orientation())
     initial_altitude = initial_position['z']
     pid.target_altitude = initial_altitude  # Start at current altitude
     
     frame_counter = 0
+    last_mode = flight_mode.get_mode()
+    last_mission_state = mission.state
+    battery_alerts = sorted(CONFIG['battery_alerts'], reverse=True)
+    publish_event({'event': 'start'})
     
     # Main control loop
     while robot.step(timestep) != -1:
+        # Apply inbound control messages between physics steps
+        command_bus.drain()
+        command = latest_command['data']
+        latest_command['data'] = None
+        
         # Read sensors
-        orientation = sensors.get_orientation()
+        raw_orientation = sensors.get_orientation()
         angular_velocity = sensors.get_angular_velocity()
-        position = sensors.get_position()
+        raw_position = sensors.get_position()
+        
+        # Fuse GPS, IMU and gyro into the state estimate
+        update_start = time.perf_counter()
+        estimator.update(raw_position, raw_orientation, angular_velocity, step_seconds)
+        estimator_monitor.record_update(time.perf_counter() - update_start)
+        
+        if CONFIG['use_state_estimate']:
+            orientation = estimator.get_orientation()
+            position = estimator.get_position()
+        else:
+            orientation = raw_orientation
+            position = raw_position
         altitude = position['z']
         
         # Update flight mode logic
         current_pos = [position['x'], position['y'], position['z']]
-        flight_mode.update(altitude, pid, current_pos)
+        flight_mode.update(altitude, pid, current_pos, orientation['yaw'])
+        
+        if mission.state != last_mission_state:
+            last_mission_state = mission.state
+            if mission.state == 'failed':
+                raise_alert('mission_failed', waypoint=mission.index)
+            else:
+                alerts.pop('mission_failed', None)
+                publish_event({'event': 'mission', 'state': mission.state,
+                               'waypoint': mission.index})
+        if flight_mode.get_mode() != last_mode:
+            publish_event({'event': 'flight_mode', 'mode': flight_mode.get_mode(),
+                           'previous': last_mode})
+            last_mode = flight_mode.get_mode()
         
         # In idle mode, disable all motors and ignore commands
         if flight_mode.is_idle():
             # Update initial_altitude to current position when idle (for takeoff from landed position)
             initial_altitude = altitude
             pid.target_altitude = initial_altitude
-            # Clear any commands from queue
-            websocket.get_command()
             # Set all motors to zero
             motor_speeds = motors.set_motor_speeds(0, 0, 0, 0)
         else:
             # Handle user commands (only in manual mode)
             if flight_mode.is_manual_mode():
-                command = websocket.get_command()
                 if command:
                     pid.update_target_altitude(command['vertical'])
                     pid.update_disturbances(
@@ -112,15 +231,33 @@ def main():
         
         # Update simulated sensors
         sensors.update_simulated_sensors(motor_speeds, timestep)
+        if battery_alerts and sensors.battery < battery_alerts[0]:
+            raise_alert('battery_low', level=battery_alerts.pop(0),
+                        battery=round(sensors.battery, 1))
         
-        # Process camera and send telemetry
-        frame_counter += 1
-        if frame_counter % CONFIG['frame_interval'] == 0:
+        # Feed the optical flow worker while the gimbal looks at the ground
+        optical_flow.poll()
+        if (optical_flow.is_ready() and
+                websocket.has_subscribers('telemetry') and
+                motors.camera_angles['pitch'] >= CONFIG['flow_min_camera_pitch']):
+            optical_flow.submit(
+                sensors.get_camera_image(),
+                robot.getTime(),
+                altitude,
+                orientation['yaw'] + math.radians(motors.camera_angles['yaw'])
+            )
+        
+        sim_time = robot.getTime()
+        
+        # Camera frames are paced in wall-clock time, not by step count
+        if (websocket.has_subscribers('camera') and
+                capture.should_capture(websocket.is_delivered('camera'),
+                                       websocket.topic_rates.get('camera'))):
             try:
                 image_data = sensors.get_camera_image()
                 if image_data:
+                    capture.record_capture(sim_time)
                     dimensions = sensors.get_camera_dimensions()
-                    fps = camera_proc.calculate_fps()
                     
                     image_base64 = camera_proc.process_image(
                         image_data,
@@ -132,28 +269,51 @@ def main():
                         image_base64,
                         dimensions['width'],
                         dimensions['height'],
-                        fps
+                        capture.get_metadata()
                     )
                     
+                    websocket.publish('camera', camera_data, sim_time)
+            except Exception as e:
+                pass
+        
+        # Produce only the topics someone is subscribed to
+        frame_counter += 1
+        if frame_counter % CONFIG['frame_interval'] == 0:
+            try:
+                if websocket.should_publish('telemetry'):
                     telemetry_data = TelemetryFormatter.format_telemetry(
                         sensors,
                         orientation,
                         position,
                         flight_mode.get_mode(),
-                        robot.getTime()
+                        sim_time
                     )
                     telemetry_data['target'] = round(pid.target_altitude, 2)
+                    telemetry_data['mission'] = mission.get_status()
+                    telemetry_data['velocity'] = {
+                        axis: round(v, 2) for axis, v in estimator.get_velocity().items()
+                    }
+                    telemetry_data['ground_velocity'] = optical_flow.get_estimate(sim_time)
                     
-                    message = TelemetryFormatter.create_message(
-                        camera_data,
-                        telemetry_data,
-                        robot.getTime()
-                    )
+                    websocket.publish('telemetry', telemetry_data, sim_time)
+                
+                if websocket.should_publish('stats'):
+                    estimator_monitor.compare(estimator, raw_position, raw_orientation)
+                    stats_data = {
+                        'estimator': estimator_monitor.get_stats(),
+                        'command_bus': command_bus.get_stats(),
+                        'planner': dict(planner.stats),
+                        'capture': capture.get_stats(),
+                        'subscriptions': dict(websocket.topic_rates)
+                    }
                     
-                    websocket.update_frame(message)
+                    websocket.publish('stats', stats_data, sim_time)
                     
             except Exception as e:
                 pass
+    
+    optical_flow.close()
+    planner.close()
 
 if __name__ == '__main__':
     main()
@@ -9,6 +9,7 @@ class MotorController:
         self.rear_right = robot.getDevice('rear right propeller')
         
         self.motors = [self.front_left, self.front_right, self.rear_left, self.rear_right]
+        self.camera_angles = {'pitch': 0.0, 'yaw': 0.0}
         
         # Set propeller motors to velocity control mode
         for motor in self.motors:
@@ -49,6 +50,7 @@ class MotorController:
             # Set motor positions
             self.camera_pitch.setPosition(pitch_rad)
             self.camera_yaw.setPosition(yaw_rad)
+            self.camera_angles = {'pitch': pitch_deg, 'yaw': yaw_deg}
             
             return True
         return False
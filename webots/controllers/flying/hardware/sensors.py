@@ -73,7 +73,8 @@ class SensorManager:
         gyro_values = self.gyro.getValues()
         return {
             'roll_velocity': gyro_values[0],
-            'pitch_velocity': gyro_values[1]
+            'pitch_velocity': gyro_values[1],
+            'yaw_velocity': gyro_values[2]
         }
     
     def get_position(self):
@@ -123,3 +124,7 @@ class SensorManager:
             'width': self.camera.getWidth(),
             'height': self.camera.getHeight()
         }
+    
+    def get_camera_fov(self):
+        """Get camera horizontal field of view in radians"""
+        return self.camera.getFov()
@@ -1,14 +1,11 @@
 import base64
 import io
 from PIL import Image
-import time
 
 class CameraProcessor:
     def __init__(self, config):
         self.config = config
         self.active_camera = 'front'
-        self.last_frame_time = time.time()
-        self.frame_count = 0
     
     def set_active_camera(self, camera_type):
         """Switch between front and bottom camera"""
@@ -36,22 +33,14 @@ class CameraProcessor:
         img.save(buffer, format='JPEG', quality=self.config['jpeg_quality'])
         return base64.b64encode(buffer.getvalue()).decode('utf-8')
     
-    def calculate_fps(self):
-        """Calculate current FPS"""
-        current_time = time.time()
-        time_diff = current_time - self.last_frame_time
-        fps = 1.0 / time_diff if time_diff > 0 else 0
-        self.last_frame_time = current_time
-        self.frame_count += 1
-        return fps
-    
-    def create_camera_data(self, image_base64, width, height, fps):
+    def create_camera_data(self, image_base64, width, height, rates):
         """Create camera data dict for telemetry"""
-        return {
+        camera_data = {
             'width': width,
             'height': height,
             'data': image_base64,
             'active': self.active_camera,
-            'resolution': f"{width}x{height}",
-            'fps': round(fps, 1)
+            'resolution': f"{width}x{height}"
         }
+        camera_data.update(rates)
+        return camera_data
@@ -0,0 +1,74 @@
+import time
+
+
+class CaptureScheduler:
+    """Decides per control step whether to capture and encode a camera frame
+
+    Frames are paced in wall-clock time to the target output rate, whatever
+    the simulation speed, and a frame is only captured once the previous
+    one has been delivered, so no encoded frame is ever overwritten unsent.
+    If delivery doesn't happen within max_wait_frames frame periods the
+    previous frame is given up on, so a lost frame can't stall capture.
+    """
+
+    def __init__(self, target_fps, step_seconds, max_wait_frames=4):
+        self.target_fps = target_fps
+        self.step_seconds = step_seconds
+        self.max_wait_frames = max_wait_frames
+        self.last_wall = None
+        self.last_sim = None
+        self.speed_factor = 1.0
+        self.wall_fps = 0.0
+        self.sim_fps = 0.0
+        self.captured = 0
+        self.waits = 0  # Due steps spent waiting on delivery
+        self.timeouts = 0  # Frames captured without the previous one delivered
+
+    def should_capture(self, encoder_ready, max_rate=None):
+        """Check if this step should grab and encode a frame"""
+        rate = min(self.target_fps, max_rate) if max_rate else self.target_fps
+        if self.last_wall is None:
+            return encoder_ready
+        # Fire on the step closest to the deadline, using the expected wall
+        # time per step at the current simulation speed
+        wall_step = self.step_seconds / max(self.speed_factor, 1e-3)
+        elapsed = time.monotonic() - self.last_wall
+        if elapsed < 1.0 / rate - wall_step / 2:
+            return False
+        if not encoder_ready:
+            if elapsed < self.max_wait_frames / rate:
+                self.waits += 1
+                return False
+            self.timeouts += 1
+        return True
+
+    def record_capture(self, sim_time):
+        """Update rates after a frame was captured"""
+        now = time.monotonic()
+        if self.last_wall is not None:
+            wall_dt = now - self.last_wall
+            sim_dt = sim_time - self.last_sim
+            if wall_dt > 0 and sim_dt > 0:
+                self.wall_fps = 0.8 * self.wall_fps + 0.2 / wall_dt if self.wall_fps else 1.0 / wall_dt
+                self.sim_fps = 0.8 * self.sim_fps + 0.2 / sim_dt if self.sim_fps else 1.0 / sim_dt
+                self.speed_factor = 0.8 * self.speed_factor + 0.2 * sim_dt / wall_dt
+        self.last_wall = now
+        self.last_sim = sim_time
+        self.captured += 1
+
+    def get_metadata(self):
+        """Frame rate fields for the camera message"""
+        return {
+            'fps': round(self.wall_fps, 1),
+            'fps_sim': round(self.sim_fps, 1),
+            'speed_factor': round(self.speed_factor, 2),
+            'target_fps': self.target_fps
+        }
+
+    def get_stats(self):
+        """Capture counters for the stats topic"""
+        return {
+            'captured': self.captured,
+            'waits': self.waits,
+            'timeouts': self.timeouts
+        }
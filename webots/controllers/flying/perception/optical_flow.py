@@ -0,0 +1,247 @@
+import math
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def to_gray(frame, factor):
+    """Downscale a BGRA frame by block averaging into float32 grayscale"""
+    h = frame.shape[0] // factor * factor
+    w = frame.shape[1] // factor * factor
+    bgr = frame[:h, :w, :3].astype(np.float32)
+    gray = bgr[:, :, 0] * 0.114 + bgr[:, :, 1] * 0.587 + bgr[:, :, 2] * 0.299
+    return gray.reshape(h // factor, factor, w // factor, factor).mean(axis=(1, 3))
+
+
+def _pyramid(image, levels):
+    pyramid = [image]
+    for _ in range(levels - 1):
+        a = pyramid[-1]
+        h = a.shape[0] // 2 * 2
+        w = a.shape[1] // 2 * 2
+        pyramid.append(0.25 * (a[0:h:2, 0:w:2] + a[1:h:2, 0:w:2] +
+                               a[0:h:2, 1:w:2] + a[1:h:2, 1:w:2]))
+    return pyramid
+
+
+def _lk_step(prev, curr, u, v):
+    """One Lucas-Kanade solve for a global translation around (u, v)
+
+    Returns the refined (u, v) and the smallest eigenvalue of the
+    structure tensor per pixel (a texture / confidence measure).
+    """
+    ix = int(round(u))
+    iy = int(round(v))
+    h, w = prev.shape
+    y0, y1 = max(0, -iy), h - max(0, iy)
+    x0, x1 = max(0, -ix), w - max(0, ix)
+    if y1 - y0 < 8 or x1 - x0 < 8:
+        return None
+
+    p = prev[y0:y1, x0:x1]
+    c = curr[y0 + iy:y1 + iy, x0 + ix:x1 + ix]
+    avg = 0.5 * (p + c)
+    gx = 0.5 * (avg[1:-1, 2:] - avg[1:-1, :-2])
+    gy = 0.5 * (avg[2:, 1:-1] - avg[:-2, 1:-1])
+    gt = c[1:-1, 1:-1] - p[1:-1, 1:-1]
+
+    a11 = float(np.dot(gx.ravel(), gx.ravel()))
+    a12 = float(np.dot(gx.ravel(), gy.ravel()))
+    a22 = float(np.dot(gy.ravel(), gy.ravel()))
+    b1 = float(np.dot(gx.ravel(), gt.ravel()))
+    b2 = float(np.dot(gy.ravel(), gt.ravel()))
+
+    det = a11 * a22 - a12 * a12
+    if det <= 1e-9:
+        return None
+    # curr(x) ~ prev(x - d)  =>  A (d - i) = -b
+    eu = (-a22 * b1 + a12 * b2) / det
+    ev = (a12 * b1 - a11 * b2) / det
+    trace = a11 + a22
+    min_eig = 0.5 * (trace - math.sqrt(max(0.0, trace * trace - 4.0 * det)))
+    return ix + eu, iy + ev, min_eig / gt.size
+
+
+def estimate_flow(prev, curr, levels=3, iterations=3):
+    """Global image translation (pixels) from prev to curr, coarse to fine
+
+    Returns (u, v, quality), or None when the frames have no usable
+    texture. Positive u/v means the image content moved right/down.
+    """
+    pyr_prev = _pyramid(prev, levels)
+    pyr_curr = _pyramid(curr, levels)
+    u = v = 0.0
+    quality = 0.0
+    for level in reversed(range(levels)):
+        if level < levels - 1:
+            u *= 2.0
+            v *= 2.0
+        for _ in range(iterations):
+            step = _lk_step(pyr_prev[level], pyr_curr[level], u, v)
+            if step is None:
+                return None
+            shift = (int(round(u)), int(round(v)))
+            u, v, quality = step
+            if (int(round(u)), int(round(v))) == shift:
+                break
+    return u, v, quality
+
+
+def _flow_worker(shm_name, width, height, fov, config, tasks, results, ready):
+    """Worker process: estimate ground velocity from shared-memory frames"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    frame = np.ndarray((height, width, 4), dtype=np.uint8, buffer=shm.buf)
+    factor = config['flow_downscale']
+    focal = (width / 2.0) / math.tan(fov / 2.0) / factor
+    min_interval = 1.0 / config['flow_rate_hz']
+
+    prev = None
+    prev_time = None
+    last_cycle = None
+    rate = 0.0
+    ready.set()
+
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            cycle_start = time.perf_counter()
+            sim_time, altitude, yaw = task
+            gray = to_gray(frame, factor)
+
+            estimate = None
+            if prev is not None and sim_time > prev_time:
+                estimate = estimate_flow(prev, gray, config['flow_pyramid_levels'])
+            dt = sim_time - prev_time if prev_time is not None else 0.0
+            prev = gray
+            prev_time = sim_time
+
+            if last_cycle is not None:
+                interval = cycle_start - last_cycle
+                if interval > 0:
+                    rate = 1.0 / interval if rate == 0 else 0.9 * rate + 0.1 / interval
+            last_cycle = cycle_start
+
+            result = {
+                'valid': False,
+                'vx': 0.0,
+                'vy': 0.0,
+                'forward': 0.0,
+                'right': 0.0,
+                'quality': 0.0,
+                'sim_time': sim_time
+            }
+            if estimate is not None:
+                u, v, quality = estimate
+                # Content moves opposite to the camera; scale pixels to metres
+                scale = max(altitude, 0.0) / focal / dt
+                forward = v * scale  # Image top faces forward
+                right = -u * scale
+                result.update({
+                    'valid': quality >= config['flow_min_quality'],
+                    'vx': forward * math.cos(yaw) + right * math.sin(yaw),
+                    'vy': forward * math.sin(yaw) - right * math.cos(yaw),
+                    'forward': forward,
+                    'right': right,
+                    'quality': quality
+                })
+            result['latency_ms'] = (time.perf_counter() - cycle_start) * 1000.0
+            result['rate_hz'] = rate
+            results.put(result)
+
+            # Run at our own rate; the control loop only sends when we're ready
+            remaining = min_interval - (time.perf_counter() - cycle_start)
+            if remaining > 0:
+                time.sleep(remaining)
+            ready.set()
+    finally:
+        shm.close()
+
+
+class OpticalFlowEstimator:
+    """Ground-velocity estimation from the downward camera
+
+    Frames are copied into shared memory only when the worker process
+    is idle, so the control loop never blocks on it and a slow estimate
+    costs nothing but its own CPU.
+    """
+
+    def __init__(self, width, height, fov, config):
+        self.config = config
+        self.width = width
+        self.height = height
+        self.latest = None
+        self.frames_sent = 0
+
+        self._shm = shared_memory.SharedMemory(create=True, size=width * height * 4)
+        self._frame = np.ndarray((height, width, 4), dtype=np.uint8, buffer=self._shm.buf)
+        self._tasks = multiprocessing.Queue(maxsize=1)
+        self._results = multiprocessing.Queue()
+        self._ready = multiprocessing.Event()
+        self._process = multiprocessing.Process(
+            target=_flow_worker,
+            args=(self._shm.name, width, height, fov, config,
+                  self._tasks, self._results, self._ready),
+            daemon=True
+        )
+
+    def start(self):
+        """Start the worker process"""
+        self._process.start()
+
+    def is_ready(self):
+        """Check if the worker can take another frame"""
+        return self._ready.is_set()
+
+    def submit(self, image_data, sim_time, altitude, yaw):
+        """Hand a raw BGRA frame to the worker if it is idle (non-blocking)"""
+        if not image_data or not self._ready.is_set():
+            return False
+        self._ready.clear()
+        self._frame[:] = np.frombuffer(image_data, dtype=np.uint8).reshape(
+            self.height, self.width, 4)
+        self._tasks.put_nowait((sim_time, altitude, yaw))
+        self.frames_sent += 1
+        return True
+
+    def poll(self):
+        """Fetch the newest estimate, if any (non-blocking)"""
+        while True:
+            try:
+                self.latest = self._results.get_nowait()
+            except queue.Empty:
+                return self.latest
+
+    def get_estimate(self, sim_time):
+        """Latest estimate rounded for telemetry (stale ones are not valid)"""
+        if self.latest is None:
+            return None
+        estimate = self.latest
+        age = sim_time - estimate['sim_time']
+        return {
+            'valid': estimate['valid'] and age <= self.config['flow_max_age'],
+            'age': round(age, 3),
+            'vx': round(estimate['vx'], 2),
+            'vy': round(estimate['vy'], 2),
+            'forward': round(estimate['forward'], 2),
+            'right': round(estimate['right'], 2),
+            'quality': round(estimate['quality'], 2),
+            'latency_ms': round(estimate['latency_ms'], 2),
+            'rate_hz': round(estimate['rate_hz'], 1)
+        }
+
+    def close(self):
+        """Stop the worker and release shared memory"""
+        try:
+            self._tasks.put_nowait(None)
+        except queue.Full:
+            pass
+        self._process.join(timeout=1.0)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._shm.close()
+        self._shm.unlink()